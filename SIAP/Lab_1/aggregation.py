@@ -0,0 +1,272 @@
+import numpy as np
+import pandas as pd
+
+from columnar import CATEGORY_COLUMN, VALUE_COLUMN, is_columnar, iter_columnar_chunks
+
+DEFAULT_CHUNKSIZE = 100_000
+
+
+class Moments:
+    """Моменты Уэлфорда: количество, среднее и сумма квадратов отклонений.
+
+    Два набора моментов объединяются формулой Чана, поэтому их можно
+    считать по кускам файла и складывать в любом порядке.
+    """
+
+    __slots__ = ('n', 'mean', 'm2')
+
+    def __init__(self, n=0, mean=0.0, m2=0.0):
+        self.n = n
+        self.mean = mean
+        self.m2 = m2
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return
+        mean = float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+        self.merge(Moments(len(values), mean, m2))
+
+    def merge(self, other):
+        if other.n == 0:
+            return
+        if self.n == 0:
+            self.n, self.mean, self.m2 = other.n, other.mean, other.m2
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+
+    @property
+    def std(self):
+        # Генеральное отклонение, как np.std по умолчанию (ddof=0)
+        if self.n == 0:
+            return None
+        return float(np.sqrt(self.m2 / self.n))
+
+
+class KLLSketch:
+    """Квантильный скетч в духе KLL с ограниченной памятью.
+
+    Значения копятся в уровнях-компакторах: переполненный уровень
+    сортируется, и каждое второе значение поднимается на уровень выше
+    с удвоенным весом. Скетчи объединяются поуровневой склейкой.
+    """
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(int(np.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                even = len(items) - len(items) % 2
+                promoted = items[self._rng.integers(2):even:2]
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+                self.levels[level] = items[even:]
+            level += 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+
+    def quantile(self, q):
+        if self.n == 0:
+            return None
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(x), 2.0 ** i) for i, x in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        cum = np.cumsum(weights[order])
+        idx = int(np.searchsorted(cum, q * cum[-1]))
+        return float(items[order][min(idx, len(items) - 1)])
+
+
+class CategoryAccumulator:
+    """Частичный агрегат одной категории: моменты для отклонения и
+    точные значения либо скетч для медианы."""
+
+    def __init__(self, sketch_k=None):
+        self.moments = Moments()
+        self.sketch = KLLSketch(sketch_k) if sketch_k else None
+        self.parts = []
+
+    def update(self, values, moments=None):
+        # moments можно передать готовыми, если их уже посчитало ядро
+        values = np.asarray(values, dtype=np.float64)
+        if moments is None:
+            self.moments.update(values)
+        else:
+            self.moments.merge(moments)
+        if self.sketch is not None:
+            self.sketch.update(values)
+        else:
+            self.parts.append(values)
+
+    def merge(self, other):
+        self.moments.merge(other.moments)
+        if self.sketch is not None and other.sketch is not None:
+            self.sketch.merge(other.sketch)
+        elif self.sketch is not None:
+            for part in other.parts:
+                self.sketch.update(part)
+        else:
+            self.parts.extend(other.parts)
+
+    def compact(self):
+        # Склеиваем куски в один массив: так агрегат дешевле передавать между процессами
+        if len(self.parts) > 1:
+            self.parts = [np.concatenate(self.parts)]
+        return self
+
+    def median(self):
+        if self.sketch is not None:
+            return self.sketch.quantile(0.5)
+        if not self.parts:
+            return None
+        return float(np.median(self.compact().parts[0]))
+
+    def result(self):
+        return self.median(), self.moments.std
+
+
+def group_by_code(codes, values):
+    """Одна сортировка по (код, значение) вместо фильтра на каждую категорию.
+
+    Возвращает встреченные коды, начала и длины их групп и значения,
+    отсортированные внутри каждой группы.
+    """
+    codes = np.asarray(codes)
+    values = np.asarray(values, dtype=np.float64)
+    if len(codes) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return codes[:0], empty, empty, values[:0]
+    order = np.lexsort((values, codes))
+    sorted_codes = codes[order]
+    sorted_values = values[order]
+    starts = np.concatenate(([0], np.flatnonzero(sorted_codes[1:] != sorted_codes[:-1]) + 1))
+    counts = np.diff(np.append(starts, len(sorted_codes)))
+    return sorted_codes[starts], starts, counts, sorted_values
+
+
+def group_moments(starts, counts, sorted_values):
+    """Средние и суммы квадратов отклонений по группам через reduceat."""
+    means = np.add.reduceat(sorted_values, starts) / counts
+    dev = sorted_values - np.repeat(means, counts)
+    return means, np.add.reduceat(dev * dev, starts)
+
+
+def category_stats(codes, values):
+    """Медиана и генеральное отклонение сразу для всех категорий.
+
+    Суммы считаются через np.add.reduceat по отсортированным группам,
+    медиана берётся из середины каждой группы, так что стоимость не
+    зависит от числа категорий, кроме самой сортировки.
+    Возвращает (коды, количества, средние, m2, медианы, отклонения).
+    """
+    present, starts, counts, sorted_values = group_by_code(codes, values)
+    if len(present) == 0:
+        empty = np.empty(0)
+        return present, counts, empty, empty, empty, empty
+    means, m2 = group_moments(starts, counts, sorted_values)
+    lo = starts + (counts - 1) // 2
+    hi = starts + counts // 2
+    medians = (sorted_values[lo] + sorted_values[hi]) / 2
+    return present, counts, means, m2, medians, np.sqrt(m2 / counts)
+
+
+def update_accumulators(acc, categories, values, sketch_k=None, labels=None):
+    """Один проход по куску: значения группируются ядром по кодам
+    категорий и добавляются в накопители. Если заданы labels,
+    categories - уже целые коды, а ключом служит labels[код]."""
+    if labels is None:
+        codes, labels = pd.factorize(np.asarray(categories))
+        keep = codes >= 0
+        codes, values = codes[keep], np.asarray(values)[keep]
+    else:
+        codes = categories
+    present, starts, counts, sorted_values = group_by_code(codes, values)
+    if len(present) == 0:
+        return acc
+    means, m2 = group_moments(starts, counts, sorted_values)
+    for code, start, n, mean, m in zip(present, starts, counts, means, m2):
+        cat = labels[code]
+        if cat not in acc:
+            acc[cat] = CategoryAccumulator(sketch_k)
+        acc[cat].update(sorted_values[start:start + n], Moments(int(n), float(mean), float(m)))
+    return acc
+
+
+def stream_file(filename, chunksize=DEFAULT_CHUNKSIZE, sketch_k=None):
+    """Читает CSV кусками по chunksize строк и возвращает накопители
+    по всем встреченным категориям. Память ограничена размером куска
+    (плюс значения для точной медианы, если скетч не задан).
+
+    Колоночные входы (см. columnar.py) читаются без разбора текста.
+    """
+    if is_columnar(filename):
+        return stream_columnar(filename, chunksize, sketch_k)
+    acc = {}
+    reader = pd.read_csv(filename, usecols=[CATEGORY_COLUMN, VALUE_COLUMN],
+                         encoding='utf-8-sig', chunksize=chunksize)
+    for chunk in reader:
+        update_accumulators(acc, chunk[CATEGORY_COLUMN].to_numpy(),
+                            chunk[VALUE_COLUMN].to_numpy(dtype=np.float64), sketch_k)
+    return compact_all(acc)
+
+
+def stream_columnar(path, chunksize=DEFAULT_CHUNKSIZE, sketch_k=None, start=0, stop=None):
+    """Накопители по строкам [start, stop) колоночного файла."""
+    acc = {}
+    for codes, values, categories in iter_columnar_chunks(path, chunksize, start, stop):
+        update_accumulators(acc, codes, values, sketch_k, labels=categories)
+    return compact_all(acc)
+
+
+def compact_all(acc):
+    for a in acc.values():
+        a.compact()
+    return acc
+
+
+def merge_accumulators(target, other):
+    """Вливает накопители other в target (по категориям)."""
+    for cat, a in other.items():
+        if cat in target:
+            target[cat].merge(a)
+        else:
+            target[cat] = a
+    return target
+
+
+def summarize(acc, categories):
+    """Переводит накопители в словарь {категория: (медиана, отклонение)}."""
+    res = {}
+    for cat in categories:
+        res[cat] = acc[cat].result() if cat in acc else (None, None)
+    return res
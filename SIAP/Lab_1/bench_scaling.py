@@ -0,0 +1,162 @@
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+try:
+    import resource
+except ImportError:  # Windows: пиковую память взять неоткуда
+    resource = None
+
+from aggregation import DEFAULT_CHUNKSIZE
+from cache import entry_from_accumulators
+from generate import FORMATS, category_names, generate_files
+from main import cached_result, median_of_medians, process_file
+from parallel import BACKENDS, aggregate_files
+
+# serial - process_file по очереди, без пула: точка отсчёта для остальных
+MODES = ('serial',) + BACKENDS
+RESULT_FIELDS = ('rows', 'files', 'format', 'mode', 'workers', 'seconds', 'rows_per_sec',
+                 'rss_mb', 'children_rss_mb')
+
+
+def peak_rss_mb(who):
+    if resource is None:
+        return None
+    # ru_maxrss в килобайтах на Linux и в байтах на macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(who).ru_maxrss * scale / 2 ** 20
+
+
+def run_once(files, mode, workers, chunksize, categories):
+    """Один прогон в текущем процессе: медианы по файлам и медиана медиан.
+    Возвращает время, пиковую память и сводку для сверки режимов между собой."""
+    start = time.perf_counter()
+    if mode == 'serial':
+        all_res = [process_file(name, chunksize, categories=categories) for name in files]
+    else:
+        stats = {name: entry_from_accumulators(acc)
+                 for name, acc in aggregate_files(files, mode, workers, chunksize)}
+        all_res = [cached_result(stats[name], categories) for name in files]
+    summary = median_of_medians(all_res, categories)
+    seconds = time.perf_counter() - start
+    return {
+        'seconds': seconds,
+        'rss_mb': peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+        # Для пула процессов - пик самого большого из дочерних, а не их сумма
+        'children_rss_mb': peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+        'summary': {c: [None if v is None else round(v, 6) for v in mv]
+                    for c, mv in summary.items()},
+    }
+
+
+def run_isolated(files, mode, workers, chunksize, categories):
+    """Прогон в отдельном интерпретаторе, чтобы пик памяти относился только
+    к этому режиму, а не ко всем предыдущим."""
+    spec = json.dumps({'files': files, 'mode': mode, 'workers': workers,
+                       'chunksize': chunksize, 'categories': categories})
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), '--one', spec],
+                         capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.abspath(__file__)))
+    return json.loads(out.stdout.splitlines()[-1])
+
+
+def bench(files, rows, fmt, mode, workers, chunksize, categories, repeat):
+    """Лучшее время из repeat прогонов и наибольшая пиковая память."""
+    runs = [run_isolated(files, mode, workers, chunksize, categories) for _ in range(repeat)]
+    seconds = min(r['seconds'] for r in runs)
+    rss = [r['rss_mb'] for r in runs if r['rss_mb'] is not None]
+    children = [r['children_rss_mb'] for r in runs if r['children_rss_mb'] is not None]
+    return {
+        'rows': rows, 'files': len(files), 'format': fmt, 'mode': mode, 'workers': workers,
+        'seconds': round(seconds, 4),
+        'rows_per_sec': round(rows * len(files) / seconds),
+        'rss_mb': round(max(rss), 1) if rss else None,
+        'children_rss_mb': round(max(children), 1) if children else None,
+    }, runs[0]['summary']
+
+
+def load_baseline(path):
+    """Прошлые результаты: {(строк, файлов, формат, режим, воркеров): строк/с}"""
+    with open(path, newline='', encoding='utf-8') as f:
+        return {(int(r['rows']), int(r['files']), r['format'], r['mode'], int(r['workers'])):
+                float(r['rows_per_sec']) for r in csv.DictReader(f)}
+
+
+def format_row(r, baseline=None, tolerance=0.1):
+    line = (f"{r['rows']:>10} {r['files']:>6} {r['format']:>7} {r['mode']:>10} {r['workers']:>8} "
+            f"{r['seconds']:>9.3f} {r['rows_per_sec']:>12} "
+            f"{r['rss_mb'] if r['rss_mb'] is not None else '-':>8} "
+            f"{r['children_rss_mb'] if r['children_rss_mb'] is not None else '-':>8}")
+    if baseline is not None:
+        old = baseline.get((r['rows'], r['files'], r['format'], r['mode'], r['workers']))
+        if old:
+            ratio = r['rows_per_sec'] / old
+            # Падение скорости больше чем на tolerance помечаем как регрессию
+            line += f" {ratio:>7.2f}x" + ("  <-- медленнее" if ratio < 1 - tolerance else "")
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Масштабирование подсчёта медиан по размеру и числу воркеров")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                        help="строк в каждом файле")
+    parser.add_argument('--files', type=int, default=5)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--modes', choices=MODES, nargs='+', default=list(MODES))
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--categories', type=int, default=4)
+    parser.add_argument('--skew', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--dir', default=None, help="где создавать данные (по умолчанию - временный каталог)")
+    parser.add_argument('--out', default=None, help="записать результаты в CSV")
+    parser.add_argument('--baseline', default=None, help="CSV прошлого прогона для сравнения")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help="допустимое падение строк/с относительно baseline")
+    parser.add_argument('--one', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.one:
+        spec = json.loads(args.one)
+        print(json.dumps(run_once(spec['files'], spec['mode'], spec['workers'],
+                                  spec['chunksize'], spec['categories'])))
+        return
+
+    baseline = load_baseline(args.baseline) if args.baseline else None
+    categories = category_names(args.categories)
+    results = []
+    print(f"{'строк':>10} {'файлов':>6} {'формат':>7} {'режим':>10} {'воркеров':>8} "
+          f"{'время, с':>9} {'строк/с':>12} {'RSS, МБ':>8} {'дети, МБ':>8}"
+          + (f" {'к baseline':>8}" if baseline else ""))
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        for size in args.sizes:
+            directory = os.path.join(os.path.abspath(tmp), str(size))
+            files = generate_files(directory, args.files, size, categories, args.skew,
+                                   args.seed, args.format)
+            reference = None
+            for mode in args.modes:
+                # Последовательный режим от числа воркеров не зависит
+                for workers in ([1] if mode == 'serial' else args.workers):
+                    row, summary = bench(files, size, args.format, mode, workers, args.chunksize,
+                                         categories, args.repeat)
+                    results.append(row)
+                    print(format_row(row, baseline, args.tolerance), flush=True)
+                    reference = reference or summary
+                    if summary != reference:
+                        print(f"  результат {mode}/{workers} расходится с первым режимом")
+
+    if args.out:
+        with open(args.out, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+
+
+if __name__ == "__main__":
+    main()
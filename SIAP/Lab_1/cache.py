@@ -0,0 +1,89 @@
+import os
+import json
+import hashlib
+
+DEFAULT_CACHE_PATH = '.stats_cache.json'
+
+
+def data_files(path):
+    """Файлы с данными: сам путь или содержимое каталога (колоночный формат)."""
+    if os.path.isdir(path):
+        return [os.path.join(path, n) for n in sorted(os.listdir(path))]
+    return [path]
+
+
+def file_digest(filename, block_size=1024 * 1024):
+    """Хэш содержимого файла или каталога (blake2b), читается блоками."""
+    h = hashlib.blake2b(digest_size=16)
+    for name in data_files(filename):
+        with open(name, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                h.update(block)
+    return h.hexdigest()
+
+
+def entry_from_accumulators(acc):
+    """Переводит накопители файла в сериализуемые агрегаты по категориям."""
+    stats = {}
+    for cat, a in acc.items():
+        median, std = a.result()
+        stats[str(cat)] = {
+            'median': median,
+            'std': std,
+            'n': a.moments.n,
+            'mean': a.moments.mean,
+            'm2': a.moments.m2,
+        }
+    return stats
+
+
+class StatsCache:
+    """Дисковый кэш агрегатов по файлам.
+
+    Запись считается актуальной, пока у файла не изменились размер и
+    mtime (или хэш содержимого при use_hash=True) и параметры подсчёта.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, use_hash=False):
+        self.path = path
+        self.use_hash = use_hash
+        self.entries = {}
+        self.dirty = False
+        if os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def _signature(self, filename, params):
+        stats = [os.stat(name) for name in data_files(filename)]
+        sig = {'size': sum(st.st_size for st in stats),
+               'mtime_ns': max(st.st_mtime_ns for st in stats), 'params': params}
+        if self.use_hash:
+            sig = {'hash': file_digest(filename), 'params': params}
+        return sig
+
+    def get(self, filename, params=None):
+        """Возвращает агрегаты файла или None, если записи нет или она устарела."""
+        entry = self.entries.get(os.path.abspath(filename))
+        if entry is None or entry['signature'] != self._signature(filename, params):
+            return None
+        return entry['stats']
+
+    def put(self, filename, stats, params=None):
+        self.entries[os.path.abspath(filename)] = {
+            'signature': self._signature(filename, params),
+            'stats': stats,
+        }
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        # Пишем во временный файл и подменяем, чтобы прерванный запуск не испортил кэш
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+        self.dirty = False
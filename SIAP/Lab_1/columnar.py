@@ -0,0 +1,209 @@
+import os
+import json
+import argparse
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+CATEGORY_COLUMN = 'Категория'
+VALUE_COLUMN = 'Значение'
+FORMATS = ('npy', 'parquet')
+META_FILE = 'meta.json'
+CODES_FILE = 'codes.bin'
+VALUES_FILE = 'values.bin'
+
+
+# Колоночный формат 'npy' - каталог с тремя файлами:
+#   meta.json  - число строк, тип кодов и словарь категорий (код -> имя);
+#   codes.bin  - коды категорий (uint8/uint16/int32), сырые байты;
+#   values.bin - значения float64, сырые байты.
+# Оба бинарных файла открываются через np.memmap без копирования.
+
+def columnar_path(csv_path, fmt='npy'):
+    stem = os.path.splitext(csv_path)[0]
+    return stem + ('.parquet' if fmt == 'parquet' else '.cols')
+
+
+def is_columnar(path):
+    if str(path).endswith('.parquet'):
+        return True
+    return os.path.isfile(os.path.join(path, META_FILE))
+
+
+def code_dtype(n_categories):
+    """Самый узкий целый тип, в который помещаются коды категорий."""
+    if n_categories <= np.iinfo(np.uint8).max + 1:
+        return np.uint8
+    if n_categories <= np.iinfo(np.uint16).max + 1:
+        return np.uint16
+    return np.int32
+
+
+def _encode_chunk(chunk, mapping):
+    """Кодирует категории куска глобальными целыми кодами.
+
+    Строки без категории отбрасываются, как и при фильтрации по букве.
+    """
+    local, uniques = pd.factorize(chunk[CATEGORY_COLUMN])
+    lut = np.array([mapping.setdefault(u, len(mapping)) for u in uniques], dtype=np.int32)
+    keep = local >= 0
+    codes = lut[local[keep]] if len(lut) else np.empty(0, dtype=np.int32)
+    values = chunk[VALUE_COLUMN].to_numpy(dtype=np.float64)[keep]
+    return codes, values
+
+
+def _convert_npy(csv_path, out_path, chunksize):
+    os.makedirs(out_path, exist_ok=True)
+    codes_path = os.path.join(out_path, CODES_FILE)
+    raw_path = codes_path + '.tmp'
+    mapping = {}
+    rows = 0
+    reader = pd.read_csv(csv_path, usecols=[CATEGORY_COLUMN, VALUE_COLUMN],
+                         encoding='utf-8-sig', chunksize=chunksize)
+    with open(raw_path, 'wb') as fc, open(os.path.join(out_path, VALUES_FILE), 'wb') as fv:
+        for chunk in reader:
+            codes, values = _encode_chunk(chunk, mapping)
+            codes.tofile(fc)
+            values.tofile(fv)
+            rows += len(values)
+
+    # Число категорий известно только в конце - ужимаем коды вторым проходом
+    dtype = code_dtype(len(mapping))
+    raw = np.memmap(raw_path, dtype=np.int32, mode='r', shape=(rows,)) if rows else np.empty(0, np.int32)
+    with open(codes_path, 'wb') as fc:
+        for start in range(0, rows, chunksize):
+            raw[start:start + chunksize].astype(dtype).tofile(fc)
+    del raw
+    os.remove(raw_path)
+
+    meta = {'rows': rows, 'code_dtype': np.dtype(dtype).name,
+            'categories': [str(c) for c in mapping]}
+    # meta.json пишется последним: по нему судим, что конвертация завершена
+    with open(os.path.join(out_path, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+
+def _convert_parquet(csv_path, out_path, chunksize):
+    if pq is None:
+        raise RuntimeError("Для формата parquet нужен пакет pyarrow")
+    mapping = {}
+    schema = pa.schema([(CATEGORY_COLUMN, pa.dictionary(pa.int32(), pa.string())),
+                        (VALUE_COLUMN, pa.float64())])
+    reader = pd.read_csv(csv_path, usecols=[CATEGORY_COLUMN, VALUE_COLUMN],
+                         encoding='utf-8-sig', chunksize=chunksize)
+    with pq.ParquetWriter(out_path, schema) as writer:
+        for chunk in reader:
+            codes, values = _encode_chunk(chunk, mapping)
+            categories = pa.DictionaryArray.from_arrays(
+                pa.array(codes, type=pa.int32()), pa.array([str(c) for c in mapping], type=pa.string()))
+            writer.write_table(pa.Table.from_arrays([categories, pa.array(values)], schema=schema))
+
+
+def convert_csv(csv_path, out_path=None, fmt='npy', chunksize=1_000_000):
+    """Конвертирует CSV с колонками Категория/Значение в колоночный формат.
+
+    CSV читается кусками, так что размер файла не ограничен памятью.
+    Возвращает путь к результату.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат: {fmt}")
+    out_path = out_path or columnar_path(csv_path, fmt)
+    if fmt == 'parquet':
+        _convert_parquet(csv_path, out_path, chunksize)
+    else:
+        _convert_npy(csv_path, out_path, chunksize)
+    return out_path
+
+
+def is_stale(csv_path, out_path):
+    """True, если конвертированного файла нет или он старше исходного CSV."""
+    marker = out_path if out_path.endswith('.parquet') else os.path.join(out_path, META_FILE)
+    if not os.path.exists(marker):
+        return True
+    return os.path.getmtime(marker) < os.path.getmtime(csv_path)
+
+
+def open_npy(path):
+    """Открывает каталог формата npy: (коды, значения, категории) как memmap."""
+    with open(os.path.join(path, META_FILE), encoding='utf-8') as f:
+        meta = json.load(f)
+    rows = meta['rows']
+    if rows == 0:
+        return np.empty(0, dtype=meta['code_dtype']), np.empty(0), meta['categories']
+    codes = np.memmap(os.path.join(path, CODES_FILE), dtype=meta['code_dtype'], mode='r', shape=(rows,))
+    values = np.memmap(os.path.join(path, VALUES_FILE), dtype=np.float64, mode='r', shape=(rows,))
+    return codes, values, meta['categories']
+
+
+def row_count(path):
+    if str(path).endswith('.parquet'):
+        return pq.ParquetFile(path).metadata.num_rows
+    with open(os.path.join(path, META_FILE), encoding='utf-8') as f:
+        return json.load(f)['rows']
+
+
+def iter_columnar_chunks(path, chunksize, start=0, stop=None):
+    """Отдаёт куски (коды, значения, категории) по строкам [start, stop).
+
+    Для npy куски - срезы memmap без копирования; для parquet - буферы
+    Arrow, из которых numpy-массивы берутся без копирования, когда это
+    возможно. Категории - список имён, индексируемый кодом.
+    """
+    if str(path).endswith('.parquet'):
+        if pq is None:
+            raise RuntimeError("Для формата parquet нужен пакет pyarrow")
+        pf = pq.ParquetFile(path, read_dictionary=[CATEGORY_COLUMN])
+        stop = pf.metadata.num_rows if stop is None else stop
+        # Читаем только группы строк, пересекающие [start, stop): остальные
+        # даже не распаковываются
+        groups, pos, first = [], 0, None
+        for i in range(pf.metadata.num_row_groups):
+            n = pf.metadata.row_group(i).num_rows
+            if pos < stop and pos + n > start:
+                groups.append(i)
+                first = pos if first is None else first
+            pos += n
+        if not groups:
+            return
+        pos = first
+        for batch in pf.iter_batches(batch_size=chunksize, row_groups=groups,
+                                     columns=[CATEGORY_COLUMN, VALUE_COLUMN]):
+            if pos >= stop:
+                break
+            lo, hi = max(start - pos, 0), min(stop - pos, batch.num_rows)
+            pos += batch.num_rows
+            if hi <= lo:
+                continue
+            batch = batch.slice(lo, hi - lo)
+            cats = batch.column(0)
+            yield (cats.indices.to_numpy(zero_copy_only=False),
+                   batch.column(1).to_numpy(zero_copy_only=False),
+                   cats.dictionary.to_pylist())
+        return
+
+    codes, values, categories = open_npy(path)
+    stop = len(values) if stop is None else min(stop, len(values))
+    for lo in range(start, stop, chunksize):
+        hi = min(lo + chunksize, stop)
+        yield codes[lo:hi], values[lo:hi], categories
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Конвертация CSV в колоночный формат")
+    parser.add_argument('files', nargs='+', help="исходные CSV")
+    parser.add_argument('--format', choices=FORMATS, default='npy')
+    parser.add_argument('--chunksize', type=int, default=1_000_000)
+    args = parser.parse_args()
+    for name in args.files:
+        out = convert_csv(name, fmt=args.format, chunksize=args.chunksize)
+        print(f"{name} -> {out}")
+
+
+if __name__ == "__main__":
+    main()
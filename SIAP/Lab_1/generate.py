@@ -0,0 +1,122 @@
+import os
+import json
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from columnar import (CATEGORY_COLUMN, VALUE_COLUMN, META_FILE, CODES_FILE, VALUES_FILE,
+                      code_dtype, columnar_path)
+
+FORMATS = ('csv', 'npy')
+DEFAULT_CHUNKSIZE = 1_000_000
+
+
+def category_names(cardinality):
+    """Имена категорий: A, B, ... пока хватает алфавита, дальше C00, C01, ..."""
+    if cardinality <= 26:
+        return [chr(ord('A') + i) for i in range(cardinality)]
+    width = len(str(cardinality - 1))
+    return [f'C{i:0{width}d}' for i in range(cardinality)]
+
+
+def category_weights(cardinality, skew=0.0):
+    """Вероятности категорий по Ципфу: p(k) ~ 1 / k**skew; при skew=0 - равные
+    (тогда None, и коды берутся без таблицы вероятностей)."""
+    if not skew:
+        return None
+    weights = np.arange(1, cardinality + 1, dtype=np.float64) ** -skew
+    return weights / weights.sum()
+
+
+def generate_chunks(rng, rows, cardinality, skew=0.0, chunksize=DEFAULT_CHUNKSIZE,
+                    low=1.0, high=100.0):
+    """Куски (коды категорий, значения) общей длиной rows. Значения равномерны
+    на [low, high) и округлены до сотых, как в исходных файлах."""
+    weights = category_weights(cardinality, skew)
+    dtype = code_dtype(cardinality)
+    for start in range(0, rows, chunksize):
+        n = min(chunksize, rows - start)
+        if weights is None:
+            codes = rng.integers(cardinality, size=n, dtype=dtype)
+        else:
+            codes = rng.choice(cardinality, size=n, p=weights).astype(dtype)
+        yield codes, np.round(rng.uniform(low, high, size=n), 2)
+
+
+def write_csv(path, chunks, names):
+    names = np.asarray(names, dtype=object)
+    # utf-8-sig пишет BOM один раз, в начале файла - как в исходных CSV
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        header = True
+        for codes, values in chunks:
+            pd.DataFrame({CATEGORY_COLUMN: names[codes], VALUE_COLUMN: values}).to_csv(
+                f, header=header, index=False)
+            header = False
+        if header:
+            pd.DataFrame(columns=[CATEGORY_COLUMN, VALUE_COLUMN]).to_csv(f, index=False)
+
+
+def write_npy(path, chunks, names):
+    """Сразу в колоночный формат npy (см. columnar.py), минуя CSV."""
+    os.makedirs(path, exist_ok=True)
+    rows = 0
+    with open(os.path.join(path, CODES_FILE), 'wb') as fc, \
+            open(os.path.join(path, VALUES_FILE), 'wb') as fv:
+        for codes, values in chunks:
+            codes.tofile(fc)
+            values.tofile(fv)
+            rows += len(values)
+    meta = {'rows': rows, 'code_dtype': np.dtype(code_dtype(len(names))).name,
+            'categories': list(names)}
+    with open(os.path.join(path, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+
+def generate_files(directory='.', files=5, rows=20, categories=4, skew=0.0, seed=None,
+                   fmt='csv', chunksize=DEFAULT_CHUNKSIZE):
+    """Пишет files файлов file_1 ... file_N по rows строк и возвращает их пути.
+
+    categories - число категорий или список их имён, skew - перекос частот
+    категорий (0 - равные). Каждый файл получает свой поток случайных чисел
+    из SeedSequence(seed), так что при одном seed файл не зависит от того,
+    сколько файлов генерируется; seed=None - каждый раз новые данные.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат: {fmt}")
+    names = category_names(categories) if isinstance(categories, int) else list(categories)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i, child in enumerate(np.random.SeedSequence(seed).spawn(files), 1):
+        rng = np.random.default_rng(child)
+        chunks = generate_chunks(rng, rows, len(names), skew, chunksize)
+        path = os.path.join(directory, f'file_{i}.csv')
+        if fmt == 'npy':
+            path = columnar_path(path, 'npy')
+            write_npy(path, chunks, names)
+        else:
+            write_csv(path, chunks, names)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генерация входных файлов для Lab_1")
+    parser.add_argument('--dir', default='.', help="куда писать файлы")
+    parser.add_argument('--files', type=int, default=5)
+    parser.add_argument('--rows', type=int, default=20, help="строк в каждом файле")
+    parser.add_argument('--categories', type=int, default=4, help="число категорий")
+    parser.add_argument('--skew', type=float, default=0.0,
+                        help="перекос частот категорий по Ципфу (0 - равные)")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE,
+                        help="сколько строк генерировать за раз")
+    args = parser.parse_args()
+    for path in generate_files(args.dir, args.files, args.rows, args.categories, args.skew,
+                               args.seed, args.format, args.chunksize):
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
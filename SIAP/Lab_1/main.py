@@ -1,52 +1,113 @@
-import pandas as pd
 import numpy as np
-import random
-import concurrent.futures
+import argparse
+
+from aggregation import DEFAULT_CHUNKSIZE, stream_file, summarize
+from parallel import BACKENDS, aggregate_files
+from cache import DEFAULT_CACHE_PATH, StatsCache, entry_from_accumulators
+from columnar import FORMATS, columnar_path, convert_csv, is_stale
+from generate import generate_files as generate_data
 
 letters = ['A', 'B', 'C', 'D']
 
-for i in range(1, 6):
-    data = {
-        'Категория': [random.choice(letters) for _ in range(20)],
-        'Значение': [round(random.uniform(1, 100), 2) for _ in range(20)]
-    }
-    pd.DataFrame(data).to_csv(f'file_{i}.csv', index=False, encoding='utf-8-sig')
-
-def process_file(filename):
-    df = pd.read_csv(filename)
-    res = {}
-    for l in letters:
-        v = df[df['Категория'] == l]['Значение']
-        if len(v) > 0:
-            res[l] = (float(np.median(v)), float(np.std(v)))
+# Генерация вынесена в функцию: дочерние процессы при spawn заново
+# импортируют этот модуль и не должны перезаписывать входные файлы.
+# Большие наборы для нагрузочных прогонов - generate.py
+def generate_files(seed=None):
+    generate_data('.', files=5, rows=20, categories=letters, seed=seed)
+
+def process_file(filename, chunksize=DEFAULT_CHUNKSIZE, sketch_k=None, categories=None):
+    # Файл читается кусками, все категории считаются за один проход
+    acc = stream_file(filename, chunksize=chunksize, sketch_k=sketch_k)
+    return summarize(acc, categories or letters)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Медианы и отклонения по категориям")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE,
+                        help="сколько строк читать за раз")
+    parser.add_argument('--sketch', type=int, default=None, metavar='K',
+                        help="приближённая медиана через KLL-скетч размера K вместо точной")
+    parser.add_argument('--backend', choices=BACKENDS, default='threads',
+                        help="потоки, процессы или деление файлов на куски между процессами")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="число потоков/процессов")
+    parser.add_argument('--cache', default=DEFAULT_CACHE_PATH,
+                        help="файл кэша агрегатов по файлам")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="не читать и не писать кэш")
+    parser.add_argument('--hash', action='store_true',
+                        help="проверять актуальность кэша по хэшу содержимого, а не по размеру и mtime")
+    parser.add_argument('--format', choices=('csv',) + FORMATS, default='csv',
+                        help="читать CSV или сконвертированные колоночные файлы (конвертируются при необходимости)")
+    parser.add_argument('--no-generate', action='store_true',
+                        help="не пересоздавать входные файлы")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="зерно генератора входных файлов (по умолчанию - случайное)")
+    return parser.parse_args()
+
+def cached_result(stats, categories):
+    # {категория: агрегаты} из кэша -> {категория: (медиана, отклонение)}
+    return {l: (stats[l]['median'], stats[l]['std']) if l in stats else (None, None)
+            for l in categories}
+
+def median_of_medians(all_res, categories):
+    # {категория: (медиана медиан, отклонение медиан)}, (None, None) - данных нет
+    out = {}
+    for l in categories:
+        m = [r[l][0] for r in all_res if r[l][0] is not None]
+        out[l] = (float(np.median(m)), float(np.std(m))) if m else (None, None)
+    return out
+
+def main():
+    args = parse_args()
+    if not args.no_generate:
+        generate_files(args.seed)
+    files = [f'file_{i}.csv' for i in range(1, 6)]
+    if args.format != 'csv':
+        sources = []
+        for name in files:
+            out = columnar_path(name, args.format)
+            if is_stale(name, out):
+                convert_csv(name, out, args.format)
+            sources.append(out)
+        files = sources
+    cache = None if args.no_cache else StatsCache(args.cache, use_hash=args.hash)
+    params = {'sketch': args.sketch}
+
+    # Результаты храним по имени файла, а не в порядке завершения
+    stats_by_file = {}
+    todo = []
+    for name in files:
+        stats = cache.get(name, params) if cache else None
+        if stats is None:
+            todo.append(name)
         else:
-            res[l] = (None, None)
-    return res
-
-files = [f'file_{i}.csv' for i in range(1, 6)]
-all_res = []
-
-with concurrent.futures.ThreadPoolExecutor() as ex:
-    fut = [ex.submit(process_file, f) for f in files]
-    for f in concurrent.futures.as_completed(fut):
-        all_res.append(f.result())
-
-print("Результаты по файлам:")
-for i, r in enumerate(all_res, 1):
-    print(f"\nФайл {i}:")
-    for l in letters:
-        print(f"{l}: медиана = {r[l][0]}, отклонение = {r[l][1]}")
-
-median_by_letter = {l: [] for l in letters}
-for r in all_res:
-    for l in letters:
-        if r[l][0] is not None:
-            median_by_letter[l].append(r[l][0])
-
-print("\nМедиана из медиан и отклонение медиан:")
-for l in letters:
-    m = median_by_letter[l]
-    if len(m) > 0:
-        print(f"{l}: медиана медиан = {float(np.median(m))}, отклонение медиан = {float(np.std(m))}")
-    else:
-        print(f"{l}: данных нет")
+            stats_by_file[name] = stats
+
+    # Рабочие отдают компактные накопители, итог по файлу считается здесь
+    for name, acc in aggregate_files(todo, args.backend, args.workers, args.chunksize, args.sketch):
+        stats_by_file[name] = entry_from_accumulators(acc)
+        if cache:
+            cache.put(name, stats_by_file[name], params)
+    if cache:
+        cache.save()
+
+    # Алфавит категорий не ограничен буквами A-D: выводим и все встреченные
+    seen = set().union(*stats_by_file.values()) if stats_by_file else set()
+    categories = letters + sorted(seen - set(letters))
+    all_res = [cached_result(stats_by_file[name], categories) for name in files]
+
+    print("Результаты по файлам:")
+    for i, (name, r) in enumerate(zip(files, all_res), 1):
+        print(f"\nФайл {i} ({name}):")
+        for l in categories:
+            print(f"{l}: медиана = {r[l][0]}, отклонение = {r[l][1]}")
+
+    print("\nМедиана из медиан и отклонение медиан:")
+    for l, (median, std) in median_of_medians(all_res, categories).items():
+        if median is not None:
+            print(f"{l}: медиана медиан = {median}, отклонение медиан = {std}")
+        else:
+            print(f"{l}: данных нет")
+
+if __name__ == "__main__":
+    main()
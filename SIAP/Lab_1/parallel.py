@@ -0,0 +1,126 @@
+import io
+import os
+import csv
+import concurrent.futures
+
+import numpy as np
+import pandas as pd
+
+from aggregation import (CATEGORY_COLUMN, VALUE_COLUMN, DEFAULT_CHUNKSIZE,
+                         stream_file, stream_columnar, update_accumulators, compact_all,
+                         merge_accumulators)
+from columnar import is_columnar, row_count
+
+BACKENDS = ('threads', 'processes', 'chunks')
+RANGE_BLOCK_BYTES = 16 * 1024 * 1024
+
+
+def read_header(filename):
+    """Возвращает имена колонок и смещение первой строки данных."""
+    with open(filename, 'rb') as f:
+        line = f.readline()
+        names = next(csv.reader([line.decode('utf-8-sig')]))
+        return names, f.tell()
+
+
+def file_ranges(filename, parts):
+    """Делит тело файла на parts байтовых диапазонов примерно равного размера.
+
+    Границы не выравниваются по строкам: строка принадлежит тому
+    диапазону, в который попадает её первый байт.
+    """
+    _, data_start = read_header(filename)
+    size = os.path.getsize(filename)
+    parts = max(1, min(parts, size - data_start))
+    bounds = np.linspace(data_start, size, parts + 1).astype(np.int64)
+    return [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def row_ranges(path, parts):
+    """Делит колоночный файл на parts диапазонов строк."""
+    bounds = np.linspace(0, row_count(path), max(1, parts) + 1).astype(np.int64)
+    return [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def process_range(filename, start, end, sketch_k=None, block_bytes=RANGE_BLOCK_BYTES):
+    """Считает накопители по строкам, начинающимся в [start, end).
+
+    Диапазон читается блоками по block_bytes, каждый блок дочитывается
+    до конца строки, так что память не зависит от размера диапазона.
+    """
+    names, data_start = read_header(filename)
+    acc = {}
+    with open(filename, 'rb') as f:
+        if start > data_start:
+            # Пропускаем хвост строки, начатой в предыдущем диапазоне
+            f.seek(start - 1)
+            f.readline()
+        else:
+            f.seek(data_start)
+        pos = f.tell()
+        while pos < end:
+            block = f.read(min(block_bytes, end - pos))
+            if not block:
+                break
+            if not block.endswith(b'\n'):
+                block += f.readline()
+            pos = f.tell()
+            chunk = pd.read_csv(io.BytesIO(block), header=None, names=names,
+                                usecols=[CATEGORY_COLUMN, VALUE_COLUMN])
+            update_accumulators(acc, chunk[CATEGORY_COLUMN].to_numpy(),
+                                chunk[VALUE_COLUMN].to_numpy(dtype=np.float64), sketch_k)
+    return compact_all(acc)
+
+
+def aggregate_files(files, backend='threads', workers=None,
+                    chunksize=DEFAULT_CHUNKSIZE, sketch_k=None):
+    """Считает накопители по файлам выбранным бэкендом.
+
+    threads   - по файлу на поток;
+    processes - по файлу на процесс, без общего GIL;
+    chunks    - каждый файл режется на байтовые диапазоны (для колоночных
+                файлов - на диапазоны строк), которые обрабатываются
+                разными процессами и затем сливаются.
+
+    Генератор отдаёт пары (имя файла, накопители) по мере готовности файлов.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд: {backend}")
+
+    if backend == 'threads':
+        executor = concurrent.futures.ThreadPoolExecutor(workers)
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(workers)
+
+    with executor as ex:
+        if backend != 'chunks':
+            fut = {ex.submit(stream_file, f, chunksize, sketch_k): f for f in files}
+            for f in concurrent.futures.as_completed(fut):
+                yield fut[f], f.result()
+            return
+
+        parts = workers or os.cpu_count() or 1
+        fut = {}
+        pending = {}
+        for name in files:
+            if is_columnar(name):
+                ranges = row_ranges(name, parts)
+                submits = [ex.submit(stream_columnar, name, chunksize, sketch_k, start, stop)
+                           for start, stop in ranges]
+            else:
+                ranges = file_ranges(name, parts)
+                submits = [ex.submit(process_range, name, start, end, sketch_k)
+                           for start, end in ranges]
+            pending[name] = len(submits)
+            for f in submits:
+                fut[f] = name
+        partial = {name: {} for name in files}
+        for name in files:
+            if pending[name] == 0:
+                yield name, partial.pop(name)
+        for f in concurrent.futures.as_completed(fut):
+            name = fut[f]
+            merge_accumulators(partial[name], f.result())
+            pending[name] -= 1
+            if pending[name] == 0:
+                yield name, partial.pop(name)
@@ -1,11 +1,27 @@
 import pandas as pd
+import os
 import math
-from functools import reduce
+from functools import reduce, wraps
 from contextlib import contextmanager
 
+from slang import (CompiledProgram, Var, code_cache, collect_variables, generate,
+                   iter_statements, simple_statement, source_hash, tokenize_line, write_lines)
+from optimizer import Optimizer, optimization_report
+
+# Вывод этапов можно отключить (SLANG_QUIET=1 или set_stage_output(False)),
+# чтобы пакетная трансляция не засыпала stdout
+_stage_output = os.getenv("SLANG_QUIET", "") in ("", "0")
+
+def set_stage_output(enabled):
+    global _stage_output
+    _stage_output = enabled
+
 # Декоратор для вывода начала и конца выполнения функций
 def show_stage(func):
+    @wraps(func)
     def wrapper(*args, **kwargs):
+        if not _stage_output:
+            return func(*args, **kwargs)
         print(f"--- Начало функции: {func.__name__} ---")
         result = func(*args, **kwargs)
         print(f"--- Конец функции: {func.__name__} ---")
@@ -24,95 +40,107 @@ def temp_file(path, text):
 
 # Класс Транслятора
 class SlangTranslator:
-    def __init__(self):
+    def __init__(self, cache=code_cache, optimize=False):
         self.source_code = []
         self.python_code = []
         self.variables = {}
+        self.cache = cache
+        self.optimize = optimize
+        self.optimizations = {}
+        self.compiled = None
 
     @show_stage
     def load_source(self, code_lines):
         self.source_code = code_lines
+        self.compiled = None
 
     def translate_line(self, line):
-        line = line.strip()
-        if line.startswith("VAR "):
-            parts = line.split("=")
-            left = parts[0].strip()
-            right = parts[1].strip()
-            name = left.split()[1]
-            self.variables[name] = right
-            self.python_code.append(f"{name} = {right}")
-        elif line.startswith("PRINT "):
-            expr = line[6:].strip()
-            self.python_code.append(f"print({expr})")
-        elif line.startswith("LOOP "):
-            n = line.split()[1].strip(":")
-            self.python_code.append(f"for i in range({n}):")
-        elif line.startswith("IF "):
-            condition = line[3:].strip(":")
-            self.python_code.append(f"if {condition}:")
-        elif line.startswith("ELSE"):
-            self.python_code.append("else:")
-        elif line == "ENDLOOP" or line == "ENDIF":
-            pass
-        else:
-            self.python_code.append(f"# неизвестная конструкция: {line}")
+        # Одна строка вне блоков: LOOP/IF без тела здесь не имеют смысла
+        tok = tokenize_line(line)
+        node = simple_statement(tok)
+        if isinstance(node, Var):
+            self.variables[node.name] = node.expr
+        self.python_code.extend(generate([node]))
+
+    def _stream(self, lines, variables):
+        nodes = iter_statements(lines)
+        if self.optimize:
+            opt = Optimizer()
+            self.optimizations = opt.stats
+            nodes = opt.stream(nodes)
+        for node in nodes:
+            collect_variables([node], variables)
+            yield from generate([node])
+
+    def translate_stream(self, lines):
+        """Генератор строк Python-кода. lines читаются лениво (подойдёт
+        открытый файл), в памяти держится только текущий блок верхнего уровня."""
+        return self._stream(lines, self.variables)
+
+    @show_stage
+    def translate_file(self, src_path, dst_path, buffer_size=1 << 16):
+        """Переводит SLANG-файл в Python-файл потоком, не собирая ни исходник,
+        ни результат в списки. Возвращает число прочитанных строк SLANG."""
+        read = 0
+
+        def source(f):
+            nonlocal read
+            for line in f:
+                read += 1
+                yield line
+
+        # Пишем во временный файл рядом и подменяем результат только после
+        # успешного перевода: при ошибке в SLANG не остаётся пустого .py
+        tmp_path = f"{dst_path}.{os.getpid()}.tmp"
+        try:
+            with open(src_path, encoding="utf-8") as src, \
+                    open(tmp_path, "w", encoding="utf-8", buffering=buffer_size) as dst:
+                write_lines(self.translate_stream(source(src)), dst)
+            os.replace(tmp_path, dst_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return read
 
     @show_stage
     def translate(self):
-        loop_mode = False
-        loop_body = []
-        if_mode = False
-        if_body = []
-        for line in self.source_code:
-            if line.startswith("LOOP "):
-                loop_mode = True
-                self.translate_line(line)
-            elif line == "ENDLOOP":
-                for l in loop_body:
-                    self.python_code.append("    " + self.translate_inner_line(l))
-                loop_body = []
-                loop_mode = False
-            elif line.startswith("IF "):
-                if_mode = True
-                self.translate_line(line)
-            elif line == "ENDIF":
-                for l in if_body:
-                    self.python_code.append("    " + self.translate_inner_line(l))
-                if_body = []
-                if_mode = False
-            else:
-                if loop_mode:
-                    loop_body.append(line)
-                elif if_mode:
-                    if_body.append(line)
-                else:
-                    self.translate_line(line)
-
-    def translate_inner_line(self, line):
-        line = line.strip()
-        if line.startswith("VAR "):
-            parts = line.split("=")
-            left = parts[0].strip()
-            right = parts[1].strip()
-            name = left.split()[1]
-            return f"{name} = {right}"
-        elif line.startswith("PRINT "):
-            expr = line[6:].strip()
-            return f"print({expr})"
-        else:
-            return f"# неизвестная конструкция: {line}"
+        # Списочный API поверх потокового перевода.
+        # Повторный перевод той же программы берётся из кэша целиком
+        key = source_hash(self.source_code) + (":opt" if self.optimize else "")
+        entry = self.cache.get(key) if self.cache is not None else None
+        if entry is None:
+            variables = {}
+            entry = CompiledProgram(list(self._stream(self.source_code, variables)), variables)
+            if self.cache is not None:
+                self.cache.put(key, entry)
+        self.compiled = entry
+        self.python_code.extend(entry.python_code)
+        self.variables.update(entry.variables)
+
+    def compile(self):
+        """Code object для текущего python_code; компилируется один раз на программу."""
+        entry = self.compiled
+        if entry is not None and entry.python_code == self.python_code:
+            if entry.code is None:
+                entry.code = compile("\n".join(entry.python_code), "<slang>", "exec")
+            return entry.code
+        return compile("\n".join(self.python_code), "<slang>", "exec")
 
     @show_stage
     def save_python_code(self, filename="output.py"):
         with open(filename, "w", encoding="utf-8") as f:
-            for line in self.python_code:
-                f.write(line + "\n")
+            write_lines(self.python_code, f)
 
     @show_stage
-    def run_python_code(self):
-        code_str = "\n".join(self.python_code)
-        exec(code_str, globals(), locals())
+    def run_python_code(self, sandbox=None):
+        # С sandbox (см. sandbox.SandboxPool) код выполняется в отдельном
+        # процессе с лимитами, вывод печатается здесь, результат возвращается
+        if sandbox is not None:
+            result = sandbox.run("\n".join(self.python_code))
+            print(result.stdout, end="")
+            return result
+        exec(self.compile(), globals(), locals())
 
 # Генератор чисел Фибоначчи
 def fibonacci(n):
@@ -200,6 +228,11 @@ def main():
     translator.save_python_code("translated_program.py")
     translator.run_python_code()
 
+    report = optimization_report(source)
+    print(f"Оптимизация: строк {report['lines_before']} -> {report['lines_after']}, "
+          f"символов {report['chars_before']} -> {report['chars_after']}, "
+          f"ускорение x{report['speedup']:.2f}, вывод совпадает: {report['same_output']}")
+
     df = create_dataframe()
     print("Вывод таблицы pandas:")
     print(df.head())
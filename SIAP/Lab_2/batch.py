@@ -0,0 +1,182 @@
+import io
+import os
+import sys
+import time
+import argparse
+import concurrent.futures
+from contextlib import redirect_stdout
+
+from Lab_2 import SlangTranslator, set_stage_output
+from sandbox import SandboxPool
+
+SLANG_SUFFIX = '.slang'
+
+
+def iter_sources(paths):
+    """Пути к SLANG-файлам: файлы как есть, каталоги - все *.slang внутри,
+    '-' - пути построчно из stdin. Всё отдаётся лениво."""
+    for path in paths:
+        if path == '-':
+            for line in sys.stdin:
+                if line.strip():
+                    yield line.strip()
+        elif os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in sorted(names):
+                    if name.endswith(SLANG_SUFFIX):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def output_path(path, out_dir):
+    return os.path.join(out_dir, os.path.splitext(os.path.basename(path))[0] + '.py')
+
+
+def translate_file(path, out_dir=None, optimize=False, run=False, keep_code=False):
+    """Переводит один SLANG-файл; ошибки не пробрасываются, а попадают в результат.
+
+    run выполняет программу прямо в этом процессе, keep_code возвращает
+    Python-код, чтобы выполнить его в песочнице.
+    """
+    result = {'path': path, 'output': None, 'lines': 0, 'ok': True, 'error': None,
+              'translate_time': 0.0, 'run_time': 0.0, 'stdout': None, 'code': None}
+    try:
+        start = time.perf_counter()
+        translator = SlangTranslator(optimize=optimize)
+        if out_dir and not (run or keep_code):
+            # Только сохранение - переводим потоком, не читая файл целиком
+            output = output_path(path, out_dir)
+            result['lines'] = translator.translate_file(path, output)
+            result['output'] = output
+            result['translate_time'] = time.perf_counter() - start
+            return result
+        with open(path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        translator.load_source(lines)
+        translator.translate()
+        result['lines'] = len(lines)
+        result['translate_time'] = time.perf_counter() - start
+        if keep_code:
+            result['code'] = "\n".join(translator.python_code)
+        if out_dir:
+            result['output'] = output_path(path, out_dir)
+            translator.save_python_code(result['output'])
+        if run:
+            buf = io.StringIO()
+            start = time.perf_counter()
+            with redirect_stdout(buf):
+                translator.run_python_code()
+            result['run_time'] = time.perf_counter() - start
+            result['stdout'] = buf.getvalue()
+    except Exception as e:
+        result['ok'] = False
+        result['error'] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def run_in_sandbox(results, sandbox):
+    """Выполняет переведённые программы в песочнице по мере поступления.
+
+    Зависшая или прожорливая программа упирается в лимиты своего
+    рабочего процесса и не тормозит остальные.
+    """
+    pending = {}
+
+    def finish(f):
+        r = pending.pop(f)
+        run = f.result()
+        r.update(ok=run.ok, error=run.error, stdout=run.stdout, run_time=run.wall_time)
+        return r
+
+    for r in results:
+        code = r.pop('code', None)
+        if r['ok'] and code is not None:
+            pending[sandbox.submit(code)] = r
+        else:
+            yield r
+        # Не даём очереди к песочнице расти, если трансляция её обгоняет
+        if len(pending) >= 4 * sandbox.size:
+            concurrent.futures.wait(list(pending), return_when=concurrent.futures.FIRST_COMPLETED)
+        for f in [f for f in pending if f.done()]:
+            yield finish(f)
+    for f in concurrent.futures.as_completed(list(pending)):
+        yield finish(f)
+
+
+def translate_batch(sources, out_dir=None, workers=None, optimize=False, run=False,
+                    verbose=False, max_pending=None, sandbox=None):
+    """Переводит поток файлов в пуле процессов.
+
+    В работе держится не больше max_pending задач, так что источник может
+    быть сколь угодно длинным. Результаты отдаются по мере готовности.
+    С sandbox (sandbox.SandboxPool) программы выполняются в нём, а не
+    в процессах трансляции.
+    """
+    results = _translate_batch(sources, out_dir, workers, optimize, run and sandbox is None,
+                               verbose, max_pending, sandbox is not None)
+    if sandbox is None:
+        return results
+    return run_in_sandbox(results, sandbox)
+
+
+def _translate_batch(sources, out_dir, workers, optimize, run, verbose, max_pending, keep_code):
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 4 * workers
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    with concurrent.futures.ProcessPoolExecutor(workers, initializer=set_stage_output,
+                                                initargs=(verbose,)) as ex:
+        pending = set()
+        for path in sources:
+            pending.add(ex.submit(translate_file, path, out_dir, optimize, run, keep_code))
+            if len(pending) >= max_pending:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for f in done:
+                    yield f.result()
+        for f in concurrent.futures.as_completed(pending):
+            yield f.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетная трансляция SLANG-программ")
+    parser.add_argument('paths', nargs='+', help="файлы, каталоги или '-' для списка путей из stdin")
+    parser.add_argument('-o', '--out-dir', default=None, help="куда сохранять .py")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--optimize', action='store_true', help="оптимизировать код")
+    parser.add_argument('--run', action='store_true',
+                        help="выполнять переведённые программы в песочнице")
+    parser.add_argument('--run-workers', type=int, default=2, help="процессов песочницы")
+    parser.add_argument('--timeout', type=float, default=10.0, help="лимит времени на программу, с")
+    parser.add_argument('--cpu', type=int, default=5, help="лимит процессорного времени, с")
+    parser.add_argument('--memory', type=int, default=512, help="лимит памяти, МБ")
+    parser.add_argument('--verbose', action='store_true', help="печатать этапы транслятора")
+    args = parser.parse_args()
+
+    sandbox = None
+    if args.run:
+        sandbox = SandboxPool(args.run_workers, args.cpu, args.memory, args.timeout)
+
+    start = time.perf_counter()
+    files = lines = failed = 0
+    try:
+        for r in translate_batch(iter_sources(args.paths), args.out_dir, args.workers,
+                                 args.optimize, args.run, args.verbose, sandbox=sandbox):
+            files += 1
+            lines += r['lines']
+            if not r['ok']:
+                failed += 1
+                print(f"Ошибка в {r['path']}: {r['error']}")
+            elif args.run:
+                sys.stdout.write(r['stdout'])
+    finally:
+        if sandbox is not None:
+            sandbox.close()
+    elapsed = time.perf_counter() - start
+    print(f"Файлов: {files}, с ошибками: {failed}, строк: {lines}, "
+          f"{lines / elapsed if elapsed else 0:.0f} строк/с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import io
+import os
+import time
+import random
+import argparse
+import tempfile
+from contextlib import redirect_stdout
+
+from Lab_2 import SlangTranslator, set_stage_output
+from batch import translate_batch, SLANG_SUFFIX
+
+N_VARS = 10
+
+
+def generate_program(size, depth, seed=0):
+    """SLANG-программа примерно из size строк с вложенностью блоков до depth.
+
+    Все переменные объявляются в начале, поэтому программа корректна
+    при любом исходе условий.
+    """
+    rng = random.Random(seed)
+    lines = [f"VAR v{k} = {k}" for k in range(N_VARS)]
+
+    def block(level):
+        for _ in range(rng.randint(1, 4)):
+            r = rng.random()
+            if level < depth and r < 0.4:
+                if rng.random() < 0.5:
+                    lines.append(f"LOOP {rng.randint(1, 2)}:")
+                    block(level + 1)
+                    lines.append("ENDLOOP")
+                else:
+                    lines.append(f"IF v{rng.randrange(N_VARS)} % 2 == 0:")
+                    block(level + 1)
+                    lines.append("ELSE")
+                    block(level + 1)
+                    lines.append("ENDIF")
+            elif r < 0.75:
+                a, b = rng.randrange(N_VARS), rng.randrange(N_VARS)
+                lines.append(f"VAR v{a} = (v{b} + {rng.randint(1, 9)}) % 1000")
+            else:
+                lines.append(f"PRINT v{rng.randrange(N_VARS)}")
+
+    while len(lines) < size:
+        block(0)
+    return lines
+
+
+def best_of(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_program(lines, optimize=False, repeat=3):
+    """Время трансляции (без кэша) и выполнения одной программы."""
+    def translate():
+        t = SlangTranslator(cache=None, optimize=optimize)
+        t.load_source(lines)
+        t.translate()
+        return t
+
+    translate_time = best_of(translate, repeat)
+    translator = translate()
+    code = translator.compile()
+
+    def execute():
+        with redirect_stdout(io.StringIO()):
+            exec(code, {})
+
+    run_time = best_of(execute, repeat)
+    return translate_time, run_time
+
+
+def bench_batch(files, size, depth, workers_grid):
+    """Пакетная трансляция files сгенерированных программ разным числом процессов."""
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for k in range(files):
+            with open(os.path.join(tmp, f"p{k}{SLANG_SUFFIX}"), 'w', encoding='utf-8') as f:
+                f.write("\n".join(generate_program(size, depth, seed=k)))
+        paths = [os.path.join(tmp, f"p{k}{SLANG_SUFFIX}") for k in range(files)]
+        for workers in workers_grid:
+            start = time.perf_counter()
+            lines = sum(r['lines'] for r in translate_batch(paths, workers=workers))
+            results.append((workers, lines / (time.perf_counter() - start)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк трансляции и выполнения SLANG")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--depths', type=int, nargs='+', default=[1, 3, 6])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--optimize', action='store_true')
+    parser.add_argument('--batch-files', type=int, default=0,
+                        help="сколько программ перевести пакетно (0 - не мерить)")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+    set_stage_output(False)
+
+    print(f"{'строк':>8} {'глубина':>8} {'трансляция, строк/с':>22} {'выполнение, строк/с':>22}")
+    for size in args.sizes:
+        for depth in args.depths:
+            lines = generate_program(size, depth)
+            translate_time, run_time = bench_program(lines, args.optimize, args.repeat)
+            print(f"{len(lines):>8} {depth:>8} {len(lines) / translate_time:>22.0f} "
+                  f"{len(lines) / run_time:>22.0f}")
+
+    if args.batch_files:
+        size, depth = args.sizes[-1], args.depths[-1]
+        print(f"\nПакет: {args.batch_files} программ по ~{size} строк, глубина {depth}")
+        for workers, rate in bench_batch(args.batch_files, size, depth, args.workers):
+            print(f"процессов {workers}: {rate:.0f} строк/с")
+
+
+if __name__ == "__main__":
+    main()
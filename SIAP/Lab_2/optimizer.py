@@ -0,0 +1,414 @@
+import ast
+import io
+import math
+import re
+import time
+import operator
+from functools import lru_cache
+from collections import Counter
+from contextlib import redirect_stdout
+
+from slang import Var, Print, Loop, If, Program, generate, parse
+
+# Операции, которые можно безопасно выполнить при трансляции
+_BINOPS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+    ast.Div: operator.truediv, ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod,
+    ast.Pow: operator.pow, ast.BitAnd: operator.and_, ast.BitOr: operator.or_,
+    ast.BitXor: operator.xor, ast.LShift: operator.lshift, ast.RShift: operator.rshift,
+}
+_UNARYOPS = {ast.UAdd: operator.pos, ast.USub: operator.neg, ast.Not: operator.not_,
+             ast.Invert: operator.invert}
+_CMPOPS = {ast.Eq: operator.eq, ast.NotEq: operator.ne, ast.Lt: operator.lt,
+           ast.LtE: operator.le, ast.Gt: operator.gt, ast.GtE: operator.ge}
+_PURE_NODES = (ast.Expression, ast.Constant, ast.Name, ast.Load, ast.BinOp, ast.UnaryOp,
+               ast.BoolOp, ast.Compare, ast.operator, ast.unaryop, ast.boolop, ast.cmpop)
+_SCOPED_NODES = (ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp,
+                 ast.NamedExpr)
+_CONST_TYPES = (int, float, complex, str, bool, type(None))
+MAX_FOLDED_LEN = 1000
+
+# Значение переменной в окружении: она точно присвоена, но не константа
+_UNKNOWN = object()
+
+
+class _Folder(ast.NodeTransformer):
+    """Подставляет известные константы и сворачивает константные подвыражения.
+
+    Всё, что может упасть или раздуться (деление на ноль, огромные
+    степени и строки), остаётся до выполнения.
+    """
+
+    def __init__(self, env):
+        self.env = env
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load) and self.env.get(node.id, _UNKNOWN) is not _UNKNOWN:
+            return ast.copy_location(ast.Constant(self.env[node.id]), node)
+        return node
+
+    def _const(self, value, node):
+        if isinstance(value, float) and not math.isfinite(value):
+            return node
+        if isinstance(value, (str, bytes)) and len(value) > MAX_FOLDED_LEN:
+            return node
+        if isinstance(value, int) and value.bit_length() > 256:
+            return node
+        return ast.copy_location(ast.Constant(value), node)
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        op = _BINOPS.get(type(node.op))
+        if op is None or not (isinstance(node.left, ast.Constant) and isinstance(node.right, ast.Constant)):
+            return node
+        a, b = node.left.value, node.right.value
+        if isinstance(node.op, ast.Pow) and not (isinstance(b, int) and abs(b) <= 64):
+            return node
+        if isinstance(node.op, ast.Mult) and any(isinstance(x, (str, bytes)) for x in (a, b)) \
+                and any(isinstance(x, int) and x > MAX_FOLDED_LEN for x in (a, b)):
+            return node
+        if isinstance(node.op, ast.LShift) and isinstance(b, int) and b > 256:
+            return node
+        try:
+            return self._const(op(a, b), node)
+        except Exception:
+            return node
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        op = _UNARYOPS.get(type(node.op))
+        if op is None or not isinstance(node.operand, ast.Constant):
+            return node
+        try:
+            return self._const(op(node.operand.value), node)
+        except Exception:
+            return node
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        items = [node.left] + node.comparators
+        ops = [_CMPOPS.get(type(o)) for o in node.ops]
+        if None in ops or not all(isinstance(x, ast.Constant) for x in items):
+            return node
+        try:
+            result = all(op(a.value, b.value) for op, a, b in zip(ops, items, items[1:]))
+        except Exception:
+            return node
+        return self._const(result, node)
+
+    def visit_IfExp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.test, ast.Constant):
+            return node.body if node.test.value else node.orelse
+        return node
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        if not all(isinstance(x, ast.Constant) for x in node.values):
+            return node
+        values = [x.value for x in node.values]
+        # and/or возвращают один из операндов, а не bool
+        result = values[-1]
+        for v in values[:-1]:
+            if isinstance(node.op, ast.And) and not v or isinstance(node.op, ast.Or) and v:
+                result = v
+                break
+        return self._const(result, node)
+
+
+def _parse_expr(expr, args=False):
+    """AST выражения; при args=True - список аргументов PRINT,
+    разобранный как вызов print(...)."""
+    try:
+        tree = ast.parse(f"print({expr})" if args else expr, mode='eval')
+    except SyntaxError:
+        return None
+    if args:
+        call = tree.body
+        return call.args + [k.value for k in call.keywords]
+    return tree
+
+
+def _walk(trees):
+    for tree in trees:
+        yield from ast.walk(tree)
+
+
+def fold_expr(expr, env):
+    """Возвращает (свёрнутое выражение, константа или _UNKNOWN)."""
+    # Результат зависит только от текста и значений упомянутых констант,
+    # поэтому повторяющиеся выражения сворачиваются один раз
+    consts = tuple((n, type(env[n]), env[n]) for n in sorted(expr_names(expr))
+                   if env.get(n, _UNKNOWN) is not _UNKNOWN)
+    return _fold_cached(expr, consts)
+
+
+@lru_cache(maxsize=4096)
+def _fold_cached(expr, consts):
+    env = {n: v for n, _, v in consts}
+    tree = _parse_expr(expr)
+    # Внутри лямбд и генераторов имена могут быть локальными - не трогаем
+    if tree is None or any(isinstance(n, _SCOPED_NODES) for n in ast.walk(tree)):
+        return expr, _UNKNOWN
+    tree = ast.fix_missing_locations(_Folder(env).visit(tree))
+    body = tree.body
+    if isinstance(body, ast.Constant) and isinstance(body.value, _CONST_TYPES):
+        return ast.unparse(body), body.value
+    return ast.unparse(tree), _UNKNOWN
+
+
+def fold_args(expr, env):
+    """Свёртка аргументов PRINT по отдельности: 'a, b' остаётся двумя
+    аргументами print, а не превращается в кортеж."""
+    consts = tuple((n, type(env[n]), env[n]) for n in sorted(expr_names(expr, True))
+                   if env.get(n, _UNKNOWN) is not _UNKNOWN)
+    return _fold_args_cached(expr, consts)
+
+
+@lru_cache(maxsize=4096)
+def _fold_args_cached(expr, consts):
+    env = {n: v for n, _, v in consts}
+    try:
+        call = ast.parse(f"print({expr})", mode='eval').body
+    except SyntaxError:
+        return expr
+    if any(isinstance(n, _SCOPED_NODES) for n in _walk(_parse_expr(expr, args=True))):
+        return expr
+    folder = _Folder(env)
+    call.args = [ast.fix_missing_locations(folder.visit(a)) for a in call.args]
+    for k in call.keywords:
+        k.value = ast.fix_missing_locations(folder.visit(k.value))
+    return ast.unparse(call)[len("print("):-1]
+
+
+@lru_cache(maxsize=4096)
+def expr_names(expr, args=False):
+    tree = _parse_expr(expr, args)
+    if tree is None:
+        return frozenset(re.findall(r'[A-Za-z_]\w*', expr))
+    return frozenset(n.id for n in _walk([tree] if not args else tree) if isinstance(n, ast.Name))
+
+
+def expr_stores(expr, args=False):
+    """Имена, которые выражение само присваивает (оператор :=)."""
+    if ':=' not in expr:
+        return frozenset()
+    tree = _parse_expr(expr, args)
+    if tree is None:
+        return frozenset()
+    return frozenset(n.target.id for n in _walk([tree] if not args else tree)
+                     if isinstance(n, ast.NamedExpr))
+
+
+def is_pure(expr, env):
+    """Выражение можно вычислить раньше: нет вызовов, индексов и атрибутов,
+    все имена уже присвоены, а делитель - ненулевая константа.
+
+    expr - уже свёрнутое выражение: если все операнды известны, а оно не
+    стало константой, свёртка не удалась (например, 'ab' + 1), и вынесенное
+    вычисление упало бы раньше PRINT из тела цикла."""
+    tree = _parse_expr(expr)
+    if tree is None:
+        return False
+    if not isinstance(tree.body, ast.Constant) and \
+            all(env.get(n.id, _UNKNOWN) is not _UNKNOWN for n in ast.walk(tree) if isinstance(n, ast.Name)):
+        return False
+    for n in ast.walk(tree):
+        if not isinstance(n, _PURE_NODES):
+            return False
+        if isinstance(n, ast.Name) and n.id not in env:
+            return False
+        if isinstance(n, ast.BinOp) and isinstance(n.op, (ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)):
+            if not (isinstance(n.right, ast.Constant) and n.right.value):
+                return False
+    return True
+
+
+def names_read(nodes):
+    names = set()
+    for node in nodes:
+        if isinstance(node, Var):
+            names |= expr_names(node.expr) | expr_stores(node.expr)
+        elif isinstance(node, Print):
+            names |= expr_names(node.expr, True) | expr_stores(node.expr, True)
+        elif isinstance(node, Loop):
+            names |= expr_names(node.count) | names_read(node.body)
+        elif isinstance(node, If):
+            names |= expr_names(node.cond) | names_read(node.body) | names_read(node.orelse)
+    return names
+
+
+def assignments(nodes, counts=None):
+    """Сколько раз присваивается каждое имя (счётчик цикла - тоже присваивание)."""
+    counts = Counter() if counts is None else counts
+    for node in nodes:
+        if isinstance(node, Print):
+            counts.update(expr_stores(node.expr, True))
+        if isinstance(node, Var):
+            counts.update(expr_stores(node.expr))
+            counts[node.name] += 1
+        elif isinstance(node, Loop):
+            counts['i'] += 1
+            counts.update(expr_stores(node.count))
+            assignments(node.body, counts)
+        elif isinstance(node, If):
+            counts.update(expr_stores(node.cond))
+            assignments(node.body, counts)
+            assignments(node.orelse, counts)
+    return counts
+
+
+class Optimizer:
+    """Проход по AST: распространение и свёртка констант, удаление мёртвых
+    веток IF/ELSE и пустых циклов, вынос инвариантных присваиваний из циклов.
+
+    Окружение констант отслеживается по ходу программы: в отличие от
+    SlangTranslator.variables оно учитывает, что значение переменной
+    меняется внутри циклов и различается между ветками.
+    """
+
+    def __init__(self):
+        self.stats = Counter()
+
+    def run(self, program):
+        return Program(self.block(program.body, {}))
+
+    def stream(self, nodes):
+        """Оптимизирует поток узлов верхнего уровня, не собирая его в список."""
+        env = {}
+        for node in nodes:
+            yield from self.statement(node, env)
+
+    def block(self, nodes, env):
+        out = []
+        for node in nodes:
+            out.extend(self.statement(node, env))
+        return out
+
+    def fold(self, expr, env, args=False):
+        if args:
+            folded, value = fold_args(expr, env), _UNKNOWN
+        else:
+            folded, value = fold_expr(expr, env)
+        if folded != expr:
+            self.stats['folded'] += 1
+        for name in expr_stores(expr, args):
+            env[name] = _UNKNOWN
+        return folded, value
+
+    def statement(self, node, env):
+        if isinstance(node, Var):
+            expr, value = self.fold(node.expr, env)
+            env[node.name] = value
+            return [Var(node.name, expr)]
+        if isinstance(node, Print):
+            expr, _ = self.fold(node.expr, env, args=True)
+            return [Print(expr)]
+        if isinstance(node, If):
+            return self.if_statement(node, env)
+        if isinstance(node, Loop):
+            return self.loop(node, env)
+        return [node]
+
+    def if_statement(self, node, env):
+        cond, value = self.fold(node.cond, env)
+        if value is not _UNKNOWN:
+            # Условие известно при трансляции - остаётся только одна ветка
+            self.stats['dead_branches'] += 1
+            return self.block(node.body if value else node.orelse, env)
+        env_body, env_else = dict(env), dict(env)
+        body = self.block(node.body, env_body)
+        orelse = self.block(node.orelse, env_else)
+        # После ветвления известно только то, что совпадает в обеих ветках
+        env.clear()
+        for k, v in env_body.items():
+            if k in env_else:
+                same = v is not _UNKNOWN and type(env_else[k]) is type(v) and env_else[k] == v
+                env[k] = v if same else _UNKNOWN
+        return [If(cond, body, orelse)]
+
+    def loop(self, node, env):
+        count, n = self.fold(node.count, env)
+        if isinstance(n, int) and not isinstance(n, bool) and n <= 0:
+            self.stats['dead_loops'] += 1
+            return []
+        counts = assignments(node.body)
+        assigned = set(counts) | {'i'}
+        # Внутри тела присваиваемые в цикле имена могут быть ещё не заданы
+        inner = {k: v for k, v in env.items() if k not in assigned}
+
+        # Выносим только если тело точно выполнится хотя бы раз
+        runs = isinstance(n, int) and not isinstance(n, bool)
+        hoisted, rest = [], node.body
+        if runs:
+            rest, seen = [], set()
+            for stmt in node.body:
+                if isinstance(stmt, Var) and counts[stmt.name] == 1 and stmt.name not in seen:
+                    expr, value = fold_expr(stmt.expr, inner)
+                    if is_pure(expr, inner) and not (expr_names(expr) & assigned):
+                        hoisted.append(Var(stmt.name, expr))
+                        assigned.discard(stmt.name)
+                        inner[stmt.name] = value
+                        self.stats['hoisted'] += 1
+                        continue
+                seen |= names_read([stmt])
+                rest.append(stmt)
+
+        body = self.block(rest, dict(inner))
+        for name in assigned:
+            # Цикл с известным n > 0 точно присвоит имя, но значение неизвестно
+            if runs:
+                env[name] = _UNKNOWN
+            else:
+                env.pop(name, None)
+        for stmt in hoisted:
+            env[stmt.name] = inner[stmt.name]
+        return hoisted + [Loop(count, body)]
+
+
+def optimize(program):
+    """Оптимизированная копия AST и счётчики применённых преобразований."""
+    opt = Optimizer()
+    return opt.run(program), dict(opt.stats)
+
+
+def _time_exec(code, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            exec(code, {})
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def optimization_report(source_lines, repeat=20):
+    """Сравнивает обычный и оптимизированный перевод программы:
+    размер кода, время выполнения (лучшее из repeat) и совпадение вывода."""
+    program = parse(source_lines)
+    plain = list(generate(program.body))
+    optimized_program, stats = optimize(program)
+    optimized = list(generate(optimized_program.body))
+    plain_code = compile("\n".join(plain), "<slang>", "exec")
+    optimized_code = compile("\n".join(optimized), "<slang-opt>", "exec")
+
+    outputs = []
+    for code in (plain_code, optimized_code):
+        buf = io.StringIO()
+        with redirect_stdout(buf):
+            exec(code, {})
+        outputs.append(buf.getvalue())
+
+    plain_time = _time_exec(plain_code, repeat)
+    optimized_time = _time_exec(optimized_code, repeat)
+    return {
+        'lines_before': len(plain),
+        'lines_after': len(optimized),
+        'chars_before': sum(len(line) + 1 for line in plain),
+        'chars_after': sum(len(line) + 1 for line in optimized),
+        'time_before': plain_time,
+        'time_after': optimized_time,
+        'speedup': plain_time / optimized_time if optimized_time else float('inf'),
+        'same_output': outputs[0] == outputs[1],
+        'transforms': stats,
+    }
@@ -0,0 +1,208 @@
+import io
+import sys
+import time
+import queue
+import signal
+import hashlib
+import builtins
+import threading
+import concurrent.futures
+import multiprocessing as mp
+from dataclasses import dataclass
+
+try:
+    import resource
+except ImportError:  # Windows: лимиты ОС недоступны, остаётся только таймаут
+    resource = None
+
+MAX_OUTPUT = 1024 * 1024
+CODE_CACHE_SIZE = 128
+
+
+@dataclass
+class RunResult:
+    ok: bool
+    stdout: str
+    error: str = None
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    timed_out: bool = False
+
+
+class CpuLimitExceeded(Exception):
+    pass
+
+
+class _LimitedOutput(io.StringIO):
+    """stdout, который перестаёт копить вывод после limit символов."""
+
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+        self.truncated = False
+
+    def write(self, s):
+        room = self.limit - self.tell()
+        if room <= 0:
+            self.truncated = True
+            return len(s)
+        if len(s) > room:
+            self.truncated = True
+        return super().write(s[:room])
+
+
+def _on_sigxcpu(signum, frame):
+    raise CpuLimitExceeded("превышен лимит процессорного времени")
+
+
+def _worker(conn, memory_mb):
+    """Цикл рабочего процесса: получает код, выполняет в чистом
+    пространстве имён и отправляет обратно вывод и время."""
+    if resource is not None:
+        if memory_mb:
+            limit = memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        signal.signal(signal.SIGXCPU, _on_sigxcpu)
+    compiled = {}
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        source, cpu_limit = task
+        key = hashlib.sha256(source.encode('utf-8')).hexdigest()
+        out = _LimitedOutput(MAX_OUTPUT)
+        error = None
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            code = compiled.get(key)
+            if code is None:
+                code = compile(source, "<slang>", "exec")
+                if len(compiled) >= CODE_CACHE_SIZE:
+                    compiled.pop(next(iter(compiled)))
+                compiled[key] = code
+            if resource is not None and cpu_limit:
+                # RLIMIT_CPU считает всё время процесса, поэтому лимит сдвигается
+                # на уже потраченное - рабочий переиспользуется между запусками
+                used = resource.getrusage(resource.RUSAGE_SELF)
+                spent = int(used.ru_utime + used.ru_stime) + 1
+                _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+                resource.setrlimit(resource.RLIMIT_CPU, (spent + cpu_limit, hard))
+            old_stdout = sys.stdout
+            sys.stdout = out
+            try:
+                exec(code, {'__builtins__': builtins, '__name__': '__slang__'})
+            finally:
+                sys.stdout = old_stdout
+        except BaseException as e:
+            if isinstance(e, KeyboardInterrupt):
+                raise
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            if resource is not None and cpu_limit:
+                _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+                resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+        stdout = out.getvalue()
+        if out.truncated:
+            stdout += "\n[вывод обрезан]\n"
+        conn.send((error is None, stdout, error,
+                   time.perf_counter() - wall, time.process_time() - cpu))
+
+
+class _Worker:
+    def __init__(self, ctx, memory_mb):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker, args=(child, memory_mb), daemon=True)
+        self.process.start()
+        child.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.kill()
+
+
+class SandboxPool:
+    """Пул прогретых рабочих процессов для выполнения переведённых программ.
+
+    Каждая программа выполняется в отдельном процессе с чистыми
+    globals, лимитами памяти (RLIMIT_AS) и процессорного времени
+    (RLIMIT_CPU) и таймаутом по часам. Рабочий, который завис или
+    упал, убивается и заменяется новым, остальные продолжают работу.
+    Это изоляция от зависаний и утечек, а не защита от враждебного кода.
+    """
+
+    def __init__(self, workers=2, cpu_time=5, memory_mb=512, timeout=10.0):
+        self.size = workers
+        self.cpu_time = cpu_time
+        self.memory_mb = memory_mb
+        self.timeout = timeout
+        self._ctx = mp.get_context('spawn')
+        self._idle = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+        for _ in range(workers):
+            self._add_worker()
+        self._executor = concurrent.futures.ThreadPoolExecutor(workers)
+
+    def _add_worker(self):
+        w = _Worker(self._ctx, self.memory_mb)
+        with self._lock:
+            self._workers.append(w)
+        self._idle.put(w)
+
+    def _replace(self, w):
+        w.kill()
+        with self._lock:
+            self._workers.remove(w)
+        self._add_worker()
+
+    def run(self, source):
+        """Выполняет код в свободном рабочем и возвращает RunResult."""
+        w = self._idle.get()
+        start = time.perf_counter()
+        try:
+            w.conn.send((source, self.cpu_time))
+            if not w.conn.poll(self.timeout):
+                self._replace(w)
+                return RunResult(False, "", "превышен таймаут", time.perf_counter() - start,
+                                 timed_out=True)
+            ok, stdout, error, wall, cpu = w.conn.recv()
+        except (EOFError, OSError) as e:
+            # Процесс убит ОС (например, по SIGKILL за CPU) - меняем рабочего
+            self._replace(w)
+            return RunResult(False, "", f"рабочий процесс упал: {type(e).__name__}",
+                             time.perf_counter() - start)
+        self._idle.put(w)
+        return RunResult(ok, stdout, error, wall, cpu)
+
+    def submit(self, source):
+        return self._executor.submit(self.run, source)
+
+    def map(self, sources):
+        return self._executor.map(self.run, sources)
+
+    def close(self):
+        self._executor.shutdown()
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for w in workers:
+            w.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,256 @@
+import re
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+
+class SlangSyntaxError(SyntaxError):
+    """Ошибка разбора SLANG-программы (с номером строки)."""
+
+    def __init__(self, message, line):
+        super().__init__(f"строка {line}: {message}")
+        self.line = line
+
+
+# ----- Токенизатор -----
+
+@dataclass
+class Token:
+    kind: str
+    line: int
+    text: str
+    args: tuple = ()
+
+
+_PATTERNS = [
+    ('VAR', re.compile(r'VAR\s+([A-Za-z_]\w*)\s*=\s*(.+)')),
+    ('PRINT', re.compile(r'PRINT\s+(.+)')),
+    ('LOOP', re.compile(r'LOOP\s+(.+?)\s*:?')),
+    ('IF', re.compile(r'IF\s+(.+?)\s*:?')),
+    ('ELSE', re.compile(r'ELSE\s*:?')),
+    ('ENDLOOP', re.compile(r'ENDLOOP')),
+    ('ENDIF', re.compile(r'ENDIF')),
+]
+
+
+def tokenize_line(text, line=0):
+    """Один токен на строку: вид конструкции и её аргументы."""
+    text = text.strip()
+    for kind, pattern in _PATTERNS:
+        m = pattern.fullmatch(text)
+        if m:
+            return Token(kind, line, text, tuple(g.strip() for g in m.groups()))
+    return Token('UNKNOWN', line, text)
+
+
+def tokenize(lines):
+    """Ленивый поток токенов, пустые строки пропускаются."""
+    for number, text in enumerate(lines, 1):
+        if text.strip():
+            yield tokenize_line(text, number)
+
+
+# ----- AST -----
+
+@dataclass
+class Var:
+    name: str
+    expr: str
+
+
+@dataclass
+class Print:
+    expr: str
+
+
+@dataclass
+class Loop:
+    count: str
+    body: list = field(default_factory=list)
+
+
+@dataclass
+class If:
+    cond: str
+    body: list = field(default_factory=list)
+    orelse: list = field(default_factory=list)
+
+
+@dataclass
+class Unknown:
+    text: str
+
+
+@dataclass
+class Program:
+    body: list = field(default_factory=list)
+
+
+# ----- Парсер -----
+
+def simple_statement(tok):
+    """Узел для однострочной конструкции (VAR, PRINT, неизвестная)."""
+    if tok.kind == 'VAR':
+        return Var(*tok.args)
+    if tok.kind == 'PRINT':
+        return Print(tok.args[0])
+    return Unknown(tok.text)
+
+
+class Parser:
+    """Рекурсивный спуск по токенам: блоки LOOP/IF/ELSE вкладываются
+    на любую глубину."""
+
+    def __init__(self, tokens):
+        self.tokens = iter(tokens)
+
+    def parse(self):
+        return Program(list(self.statements()))
+
+    def statements(self):
+        """Узлы верхнего уровня по одному, по мере чтения токенов: в памяти
+        держится только текущий незакрытый блок."""
+        for tok in self.tokens:
+            yield self.statement(tok)
+
+    def statement(self, tok):
+        if tok.kind == 'LOOP':
+            inner, _ = self.block(('ENDLOOP',), tok)
+            return Loop(tok.args[0], inner)
+        if tok.kind == 'IF':
+            inner, end = self.block(('ELSE', 'ENDIF'), tok)
+            orelse = []
+            if end.kind == 'ELSE':
+                orelse, _ = self.block(('ENDIF',), tok)
+            return If(tok.args[0], inner, orelse)
+        if tok.kind in ('ELSE', 'ENDLOOP', 'ENDIF'):
+            raise SlangSyntaxError(f"неожиданный {tok.kind}", tok.line)
+        return simple_statement(tok)
+
+    def block(self, enders, opener):
+        body = []
+        for tok in self.tokens:
+            if tok.kind in enders:
+                return body, tok
+            body.append(self.statement(tok))
+        raise SlangSyntaxError(f"{opener.kind} не закрыт до конца программы", opener.line)
+
+
+def parse(lines):
+    return Parser(tokenize(lines)).parse()
+
+
+def iter_statements(lines):
+    """Ленивый разбор: lines может быть открытым файлом."""
+    return Parser(tokenize(lines)).statements()
+
+
+# ----- Генерация Python-кода -----
+
+INDENT = "    "
+
+
+def generate(nodes, depth=0):
+    """Генератор строк Python-кода для списка узлов."""
+    pad = INDENT * depth
+    executable = False
+    for node in nodes:
+        if isinstance(node, Var):
+            yield f"{pad}{node.name} = {node.expr}"
+        elif isinstance(node, Print):
+            yield f"{pad}print({node.expr})"
+        elif isinstance(node, Loop):
+            yield f"{pad}for i in range({node.count}):"
+            yield from generate(node.body, depth + 1)
+        elif isinstance(node, If):
+            yield f"{pad}if {node.cond}:"
+            yield from generate(node.body, depth + 1)
+            if node.orelse:
+                yield f"{pad}else:"
+                yield from generate(node.orelse, depth + 1)
+        else:
+            yield f"{pad}# неизвестная конструкция: {node.text}"
+            continue
+        executable = True
+    # Пустой блок после for/if/else в Python недопустим
+    if depth and not executable:
+        yield f"{pad}pass"
+
+
+def collect_variables(nodes, variables=None):
+    """Имя -> последнее присвоенное выражение, с обходом вложенных блоков."""
+    variables = {} if variables is None else variables
+    for node in nodes:
+        if isinstance(node, Var):
+            variables[node.name] = node.expr
+        elif isinstance(node, Loop):
+            collect_variables(node.body, variables)
+        elif isinstance(node, If):
+            collect_variables(node.body, variables)
+            collect_variables(node.orelse, variables)
+    return variables
+
+
+def write_lines(lines, sink, batch=1024):
+    """Пишет строки в sink пачками по batch строк одним write на пачку.
+    Возвращает число записанных строк."""
+    count = 0
+    buf = []
+    for line in lines:
+        buf.append(line)
+        if len(buf) >= batch:
+            sink.write("\n".join(buf) + "\n")
+            count += len(buf)
+            buf.clear()
+    if buf:
+        sink.write("\n".join(buf) + "\n")
+        count += len(buf)
+    return count
+
+
+# ----- Кэш скомпилированных программ -----
+
+def source_hash(lines):
+    h = hashlib.sha256()
+    for line in lines:
+        h.update(line.strip().encode('utf-8'))
+        h.update(b'\n')
+    return h.hexdigest()
+
+
+@dataclass
+class CompiledProgram:
+    python_code: list
+    variables: dict
+    code: object = None
+
+
+class CodeCache:
+    """LRU-кэш: хэш исходника SLANG -> сгенерированный код и code object."""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+code_cache = CodeCache()
@@ -0,0 +1,130 @@
+import json
+import logging
+import time
+
+from .metrics import metrics
+
+log = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Копит строки из многих сообщений и пишет их одной транзакцией.
+
+    Строки группируются по (таблица, колонки), сброс происходит по
+    числу строк, объёму сообщений или времени ожидания первого
+    сообщения в пачке. Смещения Kafka отдаются наружу только после
+    успешного commit в БД - так сохраняется доставка "хотя бы раз".
+    schema (schema.SchemaCache) узнаёт о каждом commit и откате, чтобы
+    не считать созданными таблицы из откаченной транзакции.
+    dead_letter (decoding.DeadLetterFile/DeadLetterTopic) получает
+    сообщения, которые не удалось записать даже по одному.
+    write_each - функция записи для этих повторов по одному сообщению
+    (по умолчанию та же write).
+    """
+
+    def __init__(self, conn, write, max_rows=5000, max_bytes=4 * 1024 * 1024,
+                 linger_ms=500, clock=time.monotonic, schema=None, dead_letter=None, write_each=None):
+        self.conn = conn
+        self.write = write
+        self.write_each = write_each or write
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.linger = linger_ms / 1000
+        self.clock = clock
+        self.schema = schema
+        self.dead_letter = dead_letter
+        self._reset()
+
+    def _reset(self):
+        self.groups = {}
+        self.messages = []
+        self.offsets = {}
+        self.rows = 0
+        self.bytes = 0
+        self.started = None
+
+    def add(self, partition, offset, payload, size=0):
+        """Добавляет сообщение. Пустые и неполные сообщения не пишутся,
+        но их смещение всё равно будет подтверждено."""
+        if self.started is None:
+            self.started = self.clock()
+        self.offsets[partition] = max(offset, self.offsets.get(partition, -1))
+        self.bytes += size
+
+        payload = payload if isinstance(payload, dict) else {}
+        table_name = payload.get("table_name")
+        columns = payload.get("columns") or []
+        data = payload.get("data") or []
+        if not table_name or not columns or not data:
+            return
+        self.groups.setdefault((table_name, tuple(columns)), []).extend(data)
+        self.messages.append((partition, offset, table_name, columns, data))
+        self.rows += len(data)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def should_flush(self):
+        if self.started is None:
+            return False
+        return (self.rows >= self.max_rows or self.bytes >= self.max_bytes
+                or self.clock() - self.started >= self.linger)
+
+    def flush(self, conn=None):
+        """Пишет пачку и возвращает {партиция: следующее смещение} для commit в Kafka.
+
+        conn - соединение на время сброса (например, взятое из пула),
+        по умолчанию то, что передано в конструктор. Если общая транзакция
+        падает, сообщения пишутся по одному, чтобы одно битое сообщение
+        не потянуло за собой всю пачку (как и раньше, оно откатывается
+        и пропускается).
+        """
+        if not self.offsets:
+            return {}
+        conn = conn or self.conn
+        if self.groups:
+            try:
+                with conn.cursor() as cur:
+                    for (table_name, columns), rows in self.groups.items():
+                        self.write(cur, table_name, list(columns), rows)
+                self._commit(conn)
+                metrics.inc("rows", self.rows)
+            except Exception as e:
+                metrics.error(e)
+                self._rollback(conn)
+                self._flush_each(conn)
+            metrics.batch(self.rows)
+        metrics.inc("batches")
+        offsets = {p: off + 1 for p, off in self.offsets.items()}
+        self._reset()
+        return offsets
+
+    def _flush_each(self, conn):
+        for partition, offset, table_name, columns, data in self.messages:
+            try:
+                with conn.cursor() as cur:
+                    self.write_each(cur, table_name, columns, data)
+                self._commit(conn)
+                metrics.inc("rows", len(data))
+            except Exception as e:
+                metrics.error(e)
+                metrics.inc("skipped_messages")
+                log.warning("сообщение для %s пропущено: %s: %s", table_name, type(e).__name__, e)
+                if self.dead_letter is not None:
+                    value = json.dumps({"table_name": table_name, "columns": columns, "data": data},
+                                       ensure_ascii=False, default=str).encode("utf-8")
+                    self.dead_letter.put(value, f"{type(e).__name__}: {e}",
+                                         getattr(partition, "topic", None),
+                                         getattr(partition, "partition", partition), offset)
+                self._rollback(conn)
+
+    def _commit(self, conn):
+        with metrics.timer("commit"):
+            conn.commit()
+        if self.schema is not None:
+            self.schema.commit()
+
+    def _rollback(self, conn):
+        conn.rollback()
+        if self.schema is not None:
+            self.schema.rollback()
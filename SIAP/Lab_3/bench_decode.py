@@ -0,0 +1,77 @@
+import argparse
+import json
+import random
+import time
+
+from .decoding import DECODERS, InvalidMessage, decode_message, get_decoder
+
+
+def make_payload(rng: random.Random, columns: int, rows: int, table: str = "bench") -> dict:
+    """Сообщение в формате, который ждёт consumer_worker: строки, числа и NULL вперемешку."""
+    names = [f"col_{i}" for i in range(columns)]
+    data = []
+    for r in range(rows):
+        row = []
+        for c in range(columns):
+            kind = c % 4
+            if kind == 0:
+                row.append(r)
+            elif kind == 1:
+                row.append(round(rng.uniform(-1e6, 1e6), 3))
+            elif kind == 2:
+                row.append("".join(rng.choices("abcdefghij", k=rng.randint(4, 24))))
+            else:
+                row.append(None if rng.random() < 0.1 else rng.random() < 0.5)
+        data.append(row)
+    return {"table_name": table, "columns": names, "data": data}
+
+
+def generate_messages(count: int, columns: int, rows: int, seed: int = 0) -> list[bytes]:
+    rng = random.Random(seed)
+    return [json.dumps(make_payload(rng, columns, rows)).encode("utf-8") for _ in range(count)]
+
+
+def bench(decoder: str, messages: list[bytes], repeat: int) -> float:
+    """Лучшее время разбора и проверки всех сообщений, с."""
+    decode = get_decoder(decoder)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for raw in messages:
+            try:
+                decode_message(decode, raw)
+            except InvalidMessage:
+                pass
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Стоимость декодирования сообщений")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--columns", type=int, nargs="+", default=[4, 16])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    available = []
+    for name in DECODERS:
+        try:
+            get_decoder(name)
+            available.append(name)
+        except RuntimeError as e:
+            print(f"{name}: пропущен ({e})")
+
+    print(f"{'колонок':>8} {'строк':>6} {'декодер':>8} {'мс/МБ':>8} {'МБ/с':>8} {'мкс/сообщ.':>11}")
+    for columns in args.columns:
+        for rows in args.rows:
+            messages = generate_messages(args.messages, columns, rows)
+            mb = sum(map(len, messages)) / 1e6
+            for name in available:
+                t = bench(name, messages, args.repeat)
+                print(f"{columns:>8} {rows:>6} {name:>8} {t * 1000 / mb:>8.1f} {mb / t:>8.1f} "
+                      f"{t * 1e6 / len(messages):>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import time
+import uuid
+
+import psycopg2
+from psycopg2 import sql
+
+from .config import POSTGRES_URL
+from .consumer_worker import INSERT_STRATEGIES, choose_strategy, ensure_table, insert_rows
+
+COLUMNS = ["id", "name", "value", "payload"]
+
+
+def make_rows(n: int) -> list[list]:
+    return [[i, f"name_{i}", i * 0.5, "text\twith\nspecial \\ chars"] for i in range(n)]
+
+
+def bench(conn, table: str, rows: list[list], strategy: str, repeat: int) -> float:
+    """Лучшее время вставки rows одним способом (строк/с); таблица чистится перед каждым прогоном."""
+    best = float("inf")
+    for _ in range(repeat):
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("TRUNCATE {}").format(sql.Identifier(table)))
+            conn.commit()
+            start = time.perf_counter()
+            insert_rows(cur, table, COLUMNS, rows, strategy)
+            conn.commit()
+            best = min(best, time.perf_counter() - start)
+    return len(rows) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение способов вставки в Postgres")
+    parser.add_argument("--url", default=POSTGRES_URL)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    table = f"bench_insert_{uuid.uuid4().hex[:8]}"
+    conn = psycopg2.connect(args.url)
+    try:
+        with conn.cursor() as cur:
+            ensure_table(cur, table, COLUMNS)
+        conn.commit()
+        print(f"{'строк':>8} " + " ".join(f"{s:>10}" for s in INSERT_STRATEGIES) + "   авто")
+        for size in args.sizes:
+            rows = make_rows(size)
+            rates = [bench(conn, table, rows, s, args.repeat) for s in INSERT_STRATEGIES]
+            print(f"{size:>8} " + " ".join(f"{r:>10.0f}" for r in rates)
+                  + f"   {choose_strategy(size)}")
+    finally:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(table)))
+        conn.commit()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import argparse
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import psycopg2
+from psycopg2 import sql
+
+from .config import POSTGRES_URL
+from .consumer_worker import write_rows
+from .schema import SchemaCache
+
+COLUMNS = ["id", "user_id", "amount", "active", "created_at", "attrs", "label"]
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+# Типичные запросы потребителей: для TEXT-таблицы с приведением, которое
+# иначе пришлось бы писать в каждом запросе
+QUERIES = {
+    "sum": ("SELECT sum(amount) FROM {}",
+            "SELECT sum(amount::double precision) FROM {}"),
+    "range": ("SELECT count(*) FROM {} WHERE created_at >= '2024-06-01'",
+              "SELECT count(*) FROM {} WHERE created_at::timestamptz >= '2024-06-01'"),
+    "flag": ("SELECT count(*) FROM {} WHERE active",
+             "SELECT count(*) FROM {} WHERE active::boolean"),
+    "json": ("SELECT count(*) FROM {} WHERE attrs->>'tier' = 'gold'",
+             "SELECT count(*) FROM {} WHERE attrs::jsonb->>'tier' = 'gold'"),
+    "group": ("SELECT user_id, sum(amount) FROM {} GROUP BY user_id",
+              "SELECT user_id::bigint, sum(amount::double precision) FROM {} GROUP BY 1"),
+}
+
+
+def make_rows(n: int, seed: int = 0) -> list[list]:
+    """Строки как в сообщениях: числа, флаги, время ISO-строкой, JSON-объект и текст."""
+    rng = random.Random(seed)
+    return [[i, rng.randrange(10 ** 10), round(rng.uniform(0, 1e4), 2), rng.random() < 0.5,
+             (START + timedelta(seconds=rng.randrange(365 * 86400))).isoformat(),
+             {"tier": rng.choice(("gold", "silver", "bronze")), "score": rng.randrange(100)},
+             f"label_{rng.randrange(1000)}"]
+            for i in range(n)]
+
+
+def load(conn, table: str, schema: SchemaCache, rows: list[list], typed: bool,
+         batch: int, repeat: int) -> float:
+    """Лучшая скорость загрузки rows пачками по batch строк тем же путём,
+    что и у воркера (строк/с); таблица чистится перед каждым прогоном."""
+    with conn.cursor() as cur:
+        # Таблица создаётся по первой пачке, как у воркера
+        schema.ensure(cur, table, COLUMNS, list(zip(*rows[:batch])) if typed else None)
+    conn.commit()
+    schema.commit()
+    best = float("inf")
+    for _ in range(repeat):
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("TRUNCATE {}").format(sql.Identifier(table)))
+            conn.commit()
+            start = time.perf_counter()
+            for i in range(0, len(rows), batch):
+                write_rows(cur, table, COLUMNS, rows[i:i + batch], schema, typed=typed)
+                conn.commit()
+                schema.commit()
+            best = min(best, time.perf_counter() - start)
+    return len(rows) / best
+
+
+def query_times(conn, table: str, typed: bool, repeat: int) -> dict:
+    """Лучшее время каждого запроса, мс."""
+    times = {}
+    with conn.cursor() as cur:
+        cur.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(table)))
+        for name, (typed_query, text_query) in QUERIES.items():
+            query = sql.SQL(typed_query if typed else text_query).format(sql.Identifier(table))
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                cur.execute(query)
+                cur.fetchall()
+                best = min(best, time.perf_counter() - start)
+            times[name] = best * 1000
+    conn.commit()
+    return times
+
+
+def table_size(conn, table: str) -> int:
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_total_relation_size(%s)", (table,))
+        return cur.fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TEXT-колонки против выведенных типов")
+    parser.add_argument("--url", default=POSTGRES_URL)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--batch", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    run = uuid.uuid4().hex[:8]
+    tables = {False: f"bench_text_{run}", True: f"bench_typed_{run}"}
+    conn = psycopg2.connect(args.url)
+    try:
+        print(f"{'схема':>6} {'строк/с':>10} {'размер, МБ':>11} "
+              + " ".join(f"{q + ', мс':>10}" for q in QUERIES))
+        for typed, table in tables.items():
+            schema = SchemaCache()
+            rate = load(conn, table, schema, rows, typed, args.batch, args.repeat)
+            size = table_size(conn, table) / 2 ** 20
+            times = query_times(conn, table, typed, args.repeat)
+            print(f"{'типы' if typed else 'TEXT':>6} {rate:>10.0f} {size:>11.1f} "
+                  + " ".join(f"{times[q]:>10.1f}" for q in QUERIES))
+        with conn.cursor() as cur:
+            cur.execute("SELECT column_name, data_type FROM information_schema.columns "
+                        "WHERE table_name = %s ORDER BY ordinal_position", (tables[True],))
+            print("типы:", ", ".join(f"{c} {t}" for c, t in cur.fetchall()))
+    finally:
+        conn.rollback()
+        with conn.cursor() as cur:
+            for table in tables.values():
+                cur.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(table)))
+        conn.commit()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
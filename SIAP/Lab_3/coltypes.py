@@ -0,0 +1,160 @@
+import json
+import re
+from collections import Counter
+from datetime import date, datetime
+
+# Типы колонок, которыми управляет воркер (имена как в information_schema).
+# Колонки других типов (созданные не нами) не выводятся и не расширяются.
+TYPES = ("boolean", "integer", "bigint", "double precision",
+         "timestamp with time zone", "jsonb", "text")
+# Числа расширяются вверх по этому ряду, любые другие несовпадения - до text
+NUMERIC = ("integer", "bigint", "double precision")
+WIDENABLE = frozenset(TYPES) - {"text"}
+
+INT4 = 2 ** 31
+INT8 = 2 ** 63
+NoneType = type(None)
+
+# ISO 8601 с обязательным временем: "2024-05-01T12:30:00.123+03:00", "... 12:30Z".
+# Только дата остаётся текстом - иначе при расширении до text она бы изменилась.
+TIMESTAMP = re.compile(r"(\d{4})-(\d{2})-(\d{2})[T ]([01]\d|2[0-3]):[0-5]\d"
+                       r"(?::[0-5]\d(?:\.\d{1,6})?)?(?:Z|[+-]\d{2}(?::?\d{2})?)?")
+
+
+def is_timestamp(value: str) -> bool:
+    # Дешёвая проверка формы "YYYY-MM-DD[T ]HH:MM...", затем разбор в C
+    if len(value) < 16 or value[4] != "-" or value[7] != "-" or value[10] not in "T ":
+        return False
+    try:
+        datetime.fromisoformat(value)
+        return True
+    except ValueError:
+        pass
+    # До Python 3.11 fromisoformat не понимает "Z" и дробь не из 3 или 6 цифр
+    m = TIMESTAMP.fullmatch(value)
+    if m is None:
+        return False
+    try:
+        date(int(m[1]), int(m[2]), int(m[3]))
+    except ValueError:
+        return False
+    return True
+
+
+def infer_type(values) -> str:
+    """Самый узкий тип, в который помещаются все значения колонки; None -
+    значений нет (одни NULL). Колонка проверяется целиком: типы значений -
+    одним set(map(type)), диапазон целых - min/max; поштучно разбираются
+    только строки, похожие на время."""
+    kinds = set(map(type, values))
+    kinds.discard(NoneType)
+    if not kinds:
+        return None
+    if kinds == {bool}:
+        return "boolean"
+    if kinds == {int}:
+        present = [v for v in values if v is not None]
+        lo, hi = min(present), max(present)
+        if -INT4 <= lo and hi < INT4:
+            return "integer"
+        if -INT8 <= lo and hi < INT8:
+            return "bigint"
+        return "text"
+    if kinds <= {int, float}:
+        return "double precision"
+    if kinds <= {dict, list}:
+        return "jsonb"
+    if kinds == {str}:
+        if all(is_timestamp(v) for v in values if v is not None):
+            return "timestamp with time zone"
+    return "text"
+
+
+def value_type(value):
+    """Тип одного значения - то же, что infer_type для колонки из него одного"""
+    return infer_type((value,))
+
+
+def batch_type(values, outliers=0.0):
+    """Тип колонки по значениям пачки. Числа всегда расширяют тип по ряду
+    integer -> bigint -> double precision; выбросами (до доли outliers
+    непустых значений) считаются только значения другого семейства -
+    например, строка среди чисел не превращает колонку в text, а просто
+    не вставится. Поштучно значения разбираются, только если строгий
+    вывод дал text."""
+    strict = infer_type(values)
+    if not outliers or strict != "text":
+        return strict
+    families = Counter()
+    numeric = None
+    for value in values:
+        if value is None:
+            continue
+        kind = value_type(value)
+        if kind in NUMERIC:
+            numeric = widen(numeric, kind)
+            kind = "numeric"
+        families[kind] += 1
+    family, count = families.most_common(1)[0]
+    if family == "text" or count < (1 - outliers) * sum(families.values()):
+        return strict
+    return numeric if family == "numeric" else family
+
+
+def widen(current, observed):
+    """Тип колонки current, в который помещаются и значения типа observed"""
+    if observed is None or current == observed:
+        return current
+    if current is None:
+        return observed
+    if current in NUMERIC and observed in NUMERIC:
+        return max(current, observed, key=NUMERIC.index)
+    return "text"
+
+
+def _json_value(value):
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _text_value(value):
+    # Так же, как значение выглядело бы в COPY: true/false, JSON для объектов
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def _container_value(value):
+    return json.dumps(value, ensure_ascii=False) if isinstance(value, (dict, list)) else value
+
+
+def converter(sql_type, values):
+    """Функция приведения значений колонки к виду для вставки или None,
+    если psycopg2 и COPY справятся со значениями как есть"""
+    if sql_type == "jsonb":
+        return _json_value
+    kinds = set(map(type, values))
+    if sql_type == "text" and not kinds <= {str, NoneType}:
+        return _text_value
+    # Объекты в колонке другого типа (например, созданной не нами) - JSON-текстом,
+    # как их записал бы COPY; вставить их как есть psycopg2 не может
+    if kinds & {dict, list}:
+        return _container_value
+    return None
+
+
+def prepare_rows(rows, values, types):
+    """Строки для вставки: values - те же данные по колонкам, types - типы
+    колонок в таблице. Приводятся только колонки, которым это нужно;
+    если таких нет, возвращаются исходные строки."""
+    columns = list(values)
+    changed = False
+    for i, (column, sql_type) in enumerate(zip(values, types)):
+        convert = converter(sql_type, column)
+        if convert is not None:
+            columns[i] = [None if v is None else convert(v) for v in column]
+            changed = True
+    return list(zip(*columns)) if changed else rows
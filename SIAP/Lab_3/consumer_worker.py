@@ -1,77 +1,219 @@
+import functools
 import json
-import re
+import logging
+import time
 import psycopg2
-from kafka import KafkaConsumer
-from psycopg2.extras import execute_batch
-from psycopg2 import sql
-
-from .config import KAFKA_SERVER, KAFKA_TOPIC, POSTGRES_URL
-
-
-def sanitize_identifier(name: str) -> str:
-    """Оставляем только буквы/цифры/подчёркивание, остальное -> '_'."""
-    safe = re.sub(r"[^0-9a-zA-Z_]", "_", name)
-    if not safe:
-        safe = "t"
-    if safe[0].isdigit():
-        safe = f"t_{safe}"
-    return safe
-
-
-def ensure_table(cur, table_name: str, columns: list[str]) -> None:
+from kafka import KafkaConsumer, KafkaProducer
+from kafka.structs import OffsetAndMetadata
+from psycopg2.extras import execute_batch, execute_values
+
+from . import metrics as etl_metrics
+from .batching import MicroBatcher
+from .config import (KAFKA_SERVER, KAFKA_TOPIC, KAFKA_GROUP_ID, POSTGRES_URL,
+                     BATCH_MAX_ROWS, BATCH_MAX_BYTES, BATCH_LINGER_MS,
+                     VALUES_MIN_ROWS, COPY_MIN_ROWS, DECODER, DEAD_LETTER_PATH, DEAD_LETTER_TOPIC,
+                     TYPED_COLUMNS, TYPE_OUTLIER_SHARE)
+from .coltypes import prepare_rows
+from .decoding import DeadLetterFile, DeadLetterTopic, decode_batch, get_decoder
+from .metrics import metrics
+from .schema import SCHEMA_ERRORS, SchemaCache, insert_statement, sanitize_columns, sanitize_identifier
+
+INSERT_STRATEGIES = ("batch", "values", "copy")
+
+
+# Кэш схемы на процесс: DDL выполняется только для новых таблиц и колонок
+schema_cache = SchemaCache()
+
+
+def ensure_table(cur, table_name: str, columns: list[str], schema: SchemaCache = None,
+                 values=None, allow_widen: bool = True) -> tuple:
+    return (schema or schema_cache).ensure(cur, table_name, columns, values,
+                                           TYPE_OUTLIER_SHARE, allow_widen)
+
+
+def json_rows(rows: list) -> list:
+    """Строки, в которых dict/list заменены JSON-текстом. Делается до выбора
+    способа вставки, чтобы COPY, execute_values и execute_batch получали
+    одинаковые значения (psycopg2 не умеет dict, а list пишет как ARRAY).
+    Если таких значений нет, возвращаются исходные строки. С типами колонок
+    то же делает coltypes.prepare_rows, и второй проход не нужен."""
+    if not any(isinstance(v, (dict, list)) for row in rows for v in row):
+        return rows
+    return [[json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list)) else v
+             for v in row]
+            for row in rows]
+
+
+def copy_value(value) -> str:
+    """Значение в текстовом формате COPY: NULL -> \\N, спецсимволы экранируются."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        value = "true" if value else "false"
+    else:
+        value = str(value)
+    return (value.replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+class CopyStream:
+    """Файлоподобный источник для COPY FROM STDIN: строки формируются
+    по мере чтения, а не собираются заранее в один большой буфер."""
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buf = ""
+
+    def read(self, size=-1):
+        parts = [self.buf]
+        length = len(self.buf)
+        while size < 0 or length < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            line = "\t".join(map(copy_value, row)) + "\n"
+            parts.append(line)
+            length += len(line)
+        data = "".join(parts)
+        if size < 0:
+            self.buf = ""
+            return data
+        self.buf = data[size:]
+        return data[:size]
+
+    readline = read
+
+
+def choose_strategy(n_rows: int) -> str:
+    """Мелкие пачки - execute_batch, средние - execute_values, крупные - COPY."""
+    if n_rows >= COPY_MIN_ROWS:
+        return "copy"
+    if n_rows >= VALUES_MIN_ROWS:
+        return "values"
+    return "batch"
+
+
+def insert_rows(cur, table_name: str, columns: list[str], rows: list[list[str]],
+                strategy: str = None) -> None:
+    """Вставляет строки выбранным способом; dict/list в них уже должны быть
+    JSON-текстом (см. json_rows и coltypes.prepare_rows)."""
     safe_table = sanitize_identifier(table_name)
-    safe_cols = [sanitize_identifier(c) for c in columns]
-
-    # создаём таблицу, если нет
-    col_defs = [sql.SQL("{} TEXT").format(sql.Identifier(c)) for c in safe_cols]
-    create_stmt = sql.SQL("CREATE TABLE IF NOT EXISTS {} ({});").format(
-        sql.Identifier(safe_table),
-        sql.SQL(", ").join(col_defs)
+    safe_cols = sanitize_columns(tuple(columns))
+    strategy = strategy or choose_strategy(len(rows))
+    stmt = insert_statement(safe_table, safe_cols, strategy)
+
+    if strategy == "copy":
+        cur.copy_expert(stmt, CopyStream(rows))
+    elif strategy == "values":
+        execute_values(cur, stmt, rows, page_size=1000)
+    else:
+        execute_batch(cur, stmt, rows, page_size=100)
+
+
+def write_rows(cur, table_name: str, columns: list[str], rows: list[list[str]],
+               schema: SchemaCache = None, typed: bool = TYPED_COLUMNS,
+               allow_widen: bool = True) -> None:
+    """Пишет пачку строк одной таблицы. С typed пачка разворачивается по
+    колонкам: по ним выводятся и при необходимости расширяются типы, и
+    ими же значения приводятся к виду для вставки (JSON для jsonb и т.п.).
+    allow_widen=False - для записи сообщений по одному после сбоя пачки:
+    одно сообщение не расширяет колонку, а уходит в dead letter."""
+    schema = schema or schema_cache
+    try:
+        values = None
+        if typed:
+            # Разворот и приведение - один этап "prepare", хотя между
+            # ними выполняется ensure_table
+            start = time.perf_counter()
+            values = list(zip(*rows))
+            prepared = time.perf_counter() - start
+        with metrics.timer("ensure_table"):
+            safe_table, safe_cols = ensure_table(cur, table_name, columns, schema, values,
+                                                 allow_widen)
+        if values is not None:
+            start = time.perf_counter()
+            known = schema.columns(safe_table)
+            rows = prepare_rows(rows, values, [known.get(c) for c in safe_cols])
+            metrics.observe("prepare", prepared + time.perf_counter() - start)
+        else:
+            with metrics.timer("prepare"):
+                rows = json_rows(rows)
+        with metrics.timer("insert"):
+            insert_rows(cur, table_name, columns, rows)
+    except SCHEMA_ERRORS:
+        # Схему поменяли в обход нас - перечитаем её при следующей записи
+        schema.invalidate(table_name)
+        raise
+
+
+def commit_offsets(consumer, offsets) -> None:
+    if offsets:
+        with metrics.timer("offset_commit"):
+            consumer.commit({tp: OffsetAndMetadata(off, None) for tp, off in offsets.items()})
+
+
+def create_consumer() -> KafkaConsumer:
+    """Потребитель группы без подписки; смещения подтверждаем сами
+    и только после commit в БД. Значения приходят байтами - их разбирает
+    decode_batch, чтобы битое сообщение не ломало итерацию потребителя."""
+    return KafkaConsumer(
+        bootstrap_servers=[KAFKA_SERVER],
+        group_id=KAFKA_GROUP_ID,
+        enable_auto_commit=False,
+        auto_offset_reset="earliest"
     )
-    cur.execute(create_stmt)
 
 
-def insert_rows(cur, table_name: str, columns: list[str], rows: list[list[str]]) -> None:
-    safe_table = sanitize_identifier(table_name)
-    safe_cols = [sanitize_identifier(c) for c in columns]
+def create_dead_letter():
+    if DEAD_LETTER_TOPIC:
+        return DeadLetterTopic(KafkaProducer(bootstrap_servers=[KAFKA_SERVER]), DEAD_LETTER_TOPIC)
+    if DEAD_LETTER_PATH:
+        return DeadLetterFile(DEAD_LETTER_PATH)
+    return None
 
-    insert_stmt = sql.SQL("INSERT INTO {} ({}) VALUES ({})").format(
-        sql.Identifier(safe_table),
-        sql.SQL(", ").join(map(sql.Identifier, safe_cols)),
-        sql.SQL(", ").join(sql.Placeholder() * len(safe_cols))
-    )
-    execute_batch(cur, insert_stmt, rows, page_size=100)
+
+def poll_into(consumer, batcher, decode=None, dead_letter=None) -> None:
+    decode = decode or get_decoder(DECODER)
+    # poll с таймаутом, чтобы пачка сбрасывалась по времени и без новых сообщений
+    records = consumer.poll(timeout_ms=min(BATCH_LINGER_MS, 1000) or 100)
+    for tp, messages in records.items():
+        for msg, payload in decode_batch(messages, decode, dead_letter):
+            batcher.add(tp, msg.offset, payload, msg.serialized_value_size)
+        metrics.inc("messages", len(messages))
+        if metrics.enabled:
+            # Лаг: сколько сообщений партиции ещё не прочитано
+            highwater = consumer.highwater(tp)
+            if highwater is not None:
+                metrics.set_lag(tp, highwater - messages[-1].offset - 1)
 
 
 def main():
-    consumer = KafkaConsumer(
-        KAFKA_TOPIC,
-        bootstrap_servers=[KAFKA_SERVER],
-        value_deserializer=lambda m: json.loads(m.decode("utf-8")),
-        enable_auto_commit=True,
-        auto_offset_reset="earliest"
-    )
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    etl_metrics.start()
+    decode = get_decoder(DECODER)
+    dead_letter = create_dead_letter()
+    consumer = create_consumer()
+    consumer.subscribe([KAFKA_TOPIC])
 
     conn = psycopg2.connect(POSTGRES_URL)
     conn.autocommit = False
+    with conn.cursor() as cur:
+        schema_cache.load(cur)
+    conn.commit()
+    batcher = MicroBatcher(conn, write_rows, BATCH_MAX_ROWS, BATCH_MAX_BYTES, BATCH_LINGER_MS,
+                           schema=schema_cache, dead_letter=dead_letter,
+                           write_each=functools.partial(write_rows, allow_widen=False))
 
     try:
-        with conn.cursor() as cur:
-            for msg in consumer:
-                try:
-                    payload = msg.value
-                    table_name = payload.get("table_name")
-                    columns = payload.get("columns") or []
-                    data = payload.get("data") or []
-                    if not table_name or not columns or not data:
-                        continue
-
-                    ensure_table(cur, table_name, columns)
-                    insert_rows(cur, table_name, columns, data)
-                    conn.commit()
-                except Exception:
-                    conn.rollback()
+        while True:
+            poll_into(consumer, batcher, decode, dead_letter)
+            if batcher.should_flush():
+                commit_offsets(consumer, batcher.flush())
     finally:
+        try:
+            commit_offsets(consumer, batcher.flush())
+        except Exception:
+            pass
         try:
             consumer.close()
         except Exception:
@@ -80,9 +222,9 @@ def main():
             conn.close()
         except Exception:
             pass
+        if dead_letter is not None:
+            dead_letter.close()
 
 
 if __name__ == "__main__":
     main()
-
-
@@ -0,0 +1,154 @@
+import base64
+import json
+import threading
+import time
+from typing import Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+from .metrics import metrics
+
+DECODERS = ("json", "orjson", "msgspec")
+
+
+class InvalidMessage(ValueError):
+    """Сообщение не разбирается или не похоже на {table_name, columns, data}."""
+
+
+def validate(payload) -> dict:
+    """Проверяет форму сообщения и возвращает его же.
+
+    Пустые table_name/columns/data допустимы - такое сообщение просто
+    ничего не пишет, как и раньше.
+    """
+    if not isinstance(payload, dict):
+        raise InvalidMessage(f"ожидался объект, получен {type(payload).__name__}")
+    table_name = payload.get("table_name")
+    columns = payload.get("columns") or []
+    data = payload.get("data") or []
+    if table_name is not None and not isinstance(table_name, str):
+        raise InvalidMessage("table_name должен быть строкой")
+    if not isinstance(columns, list) or not all(isinstance(c, str) for c in columns):
+        raise InvalidMessage("columns должен быть списком строк")
+    if not isinstance(data, list):
+        raise InvalidMessage("data должен быть списком строк таблицы")
+    width = len(columns)
+    for i, row in enumerate(data):
+        if not isinstance(row, list) or len(row) != width:
+            raise InvalidMessage(f"строка {i}: ожидалось {width} значений")
+    return payload
+
+
+def _decode_json(raw: bytes):
+    return json.loads(raw)
+
+
+def _decode_orjson(raw: bytes):
+    return orjson.loads(raw)
+
+
+if msgspec is not None:
+    class Payload(msgspec.Struct):
+        table_name: Optional[str] = None
+        columns: list[str] = []
+        data: list[list] = []
+
+    _payload_decoder = msgspec.json.Decoder(Payload)
+
+    def _decode_msgspec(raw: bytes):
+        # Типы полей msgspec проверяет сам при разборе
+        p = _payload_decoder.decode(raw)
+        return {"table_name": p.table_name, "columns": p.columns, "data": p.data}
+
+
+def get_decoder(name: str = "json"):
+    """Функция bytes -> dict для выбранного парсера."""
+    if name == "json":
+        return _decode_json
+    if name == "orjson":
+        if orjson is None:
+            raise RuntimeError("Для декодера orjson нужен пакет orjson")
+        return _decode_orjson
+    if name == "msgspec":
+        if msgspec is None:
+            raise RuntimeError("Для декодера msgspec нужен пакет msgspec")
+        return _decode_msgspec
+    raise ValueError(f"Неизвестный декодер: {name}")
+
+
+def decode_message(decode, raw: bytes) -> dict:
+    """Декодирует и проверяет одно сообщение; любая ошибка - InvalidMessage."""
+    try:
+        return validate(decode(raw))
+    except InvalidMessage:
+        raise
+    except Exception as e:
+        raise InvalidMessage(f"{type(e).__name__}: {e}") from e
+
+
+class DeadLetterFile:
+    """Невалидные сообщения построчно в JSON-файл, значение - в base64.
+    Запись сразу сбрасывается на диск: смещение такого сообщения будет
+    подтверждено вместе с пачкой."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def put(self, value: bytes, error: str, topic=None, partition=None, offset=None):
+        record = {"time": time.time(), "topic": topic, "partition": partition, "offset": offset,
+                  "error": error, "value": base64.b64encode(value or b"").decode("ascii")}
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class DeadLetterTopic:
+    """Невалидные сообщения в отдельный топик Kafka как есть, причина - в заголовках."""
+
+    def __init__(self, producer, topic, timeout=10):
+        self.producer = producer
+        self.topic = topic
+        self.timeout = timeout
+
+    def put(self, value: bytes, error: str, topic=None, partition=None, offset=None):
+        headers = [("error", error.encode("utf-8")),
+                   ("source", f"{topic}[{partition}]@{offset}".encode("utf-8"))]
+        # Ждём подтверждения: смещение исходного сообщения будет закоммичено
+        self.producer.send(self.topic, value=value, headers=headers).get(timeout=self.timeout)
+
+    def close(self):
+        self.producer.close()
+
+
+def decode_batch(messages, decode, dead_letter=None):
+    """Пары (сообщение, payload) для всех сообщений одного poll.
+
+    Невалидные уходят в dead_letter (если задан) и отдаются с payload
+    None - их смещение всё равно подтверждается.
+    """
+    out = []
+    for msg in messages:
+        try:
+            with metrics.timer("deserialize"):
+                payload = decode_message(decode, msg.value)
+        except InvalidMessage as e:
+            metrics.error(e)
+            metrics.inc("dead_letters")
+            if dead_letter is not None:
+                dead_letter.put(msg.value, str(e), msg.topic, msg.partition, msg.offset)
+            payload = None
+        out.append((msg, payload))
+    return out
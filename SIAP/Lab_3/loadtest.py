@@ -0,0 +1,232 @@
+import argparse
+import functools
+import json
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import namedtuple
+from contextlib import closing
+
+from kafka.structs import TopicPartition
+
+from .batching import MicroBatcher
+from .bench_decode import make_payload
+from .config import BATCH_MAX_ROWS, BATCH_MAX_BYTES, BATCH_LINGER_MS, DECODER
+from .consumer_worker import commit_offsets, poll_into, write_rows
+from .decoding import get_decoder
+from .schema import SchemaCache, sanitize_columns, sanitize_identifier
+
+FakeRecord = namedtuple("FakeRecord", "topic partition offset value serialized_value_size produced")
+
+
+class FakeTopic:
+    """Топик в памяти: по списку сообщений на партицию, с моментом отправки."""
+
+    def __init__(self, name="loadtest", partitions=4):
+        self.partitions = [TopicPartition(name, p) for p in range(partitions)]
+        self.logs = {tp: [] for tp in self.partitions}
+        self.cond = threading.Condition()
+        self._next = 0
+
+    def produce(self, value: bytes):
+        tp = self.partitions[self._next % len(self.partitions)]
+        self._next += 1
+        with self.cond:
+            log = self.logs[tp]
+            log.append(FakeRecord(tp.topic, tp.partition, len(log), value, len(value),
+                                  time.perf_counter()))
+            self.cond.notify_all()
+
+
+class FakeConsumer:
+    """Потребитель с интерфейсом KafkaConsumer, нужным consumer_worker:
+    poll, highwater и commit. При commit считает задержку от отправки
+    до подтверждения каждого сообщения."""
+
+    def __init__(self, topic: FakeTopic, max_records=500):
+        self.topic = topic
+        self.max_records = max_records
+        self.positions = dict.fromkeys(topic.partitions, 0)
+        self.committed = dict.fromkeys(topic.partitions, 0)
+        self.latencies = []
+
+    def _available(self):
+        return any(len(self.topic.logs[tp]) > pos for tp, pos in self.positions.items())
+
+    def poll(self, timeout_ms=0):
+        with self.topic.cond:
+            self.topic.cond.wait_for(self._available, timeout_ms / 1000)
+            records = {}
+            budget = self.max_records
+            for tp, pos in self.positions.items():
+                batch = self.topic.logs[tp][pos:pos + budget]
+                if batch:
+                    records[tp] = batch
+                    self.positions[tp] = pos + len(batch)
+                    budget -= len(batch)
+                if budget <= 0:
+                    break
+        return records
+
+    def highwater(self, tp):
+        return len(self.topic.logs[tp])
+
+    def commit(self, offsets):
+        now = time.perf_counter()
+        for tp, meta in offsets.items():
+            log = self.topic.logs[tp]
+            self.latencies.extend(now - r.produced for r in log[self.committed[tp]:meta.offset])
+            self.committed[tp] = meta.offset
+
+    def committed_total(self):
+        return sum(self.committed.values())
+
+
+class SqliteTarget:
+    """SQLite вместо Postgres с тем же интерфейсом: соединение для
+    MicroBatcher и функция записи как consumer_worker.write_rows."""
+
+    def __init__(self, path=":memory:"):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.tables = {}
+
+    def cursor(self):
+        return closing(self.conn.cursor())
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def write(self, cur, table_name, columns, rows):
+        table = sanitize_identifier(table_name)
+        cols = sanitize_columns(tuple(columns))
+        known = self.tables.get(table)
+        if known is None:
+            col_defs = ", ".join(f'"{c}" TEXT' for c in cols)
+            cur.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ({col_defs})')
+            known = self.tables[table] = set(cols)
+        for c in cols:
+            if c not in known:
+                cur.execute(f'ALTER TABLE "{table}" ADD COLUMN "{c}" TEXT')
+                known.add(c)
+        names = ", ".join(f'"{c}"' for c in cols)
+        cur.executemany(
+            f'INSERT INTO "{table}" ({names}) VALUES ({", ".join("?" * len(cols))})',
+            [[v if v is None or isinstance(v, (int, float, str)) else str(v) for v in row]
+             for row in rows])
+
+    def close(self):
+        self.conn.close()
+
+
+def build_messages(tables, columns, rows, variants=50, seed=0):
+    """Заранее закодированные сообщения по кругу таблиц (генерация не попадает
+    в замер) и имена этих таблиц."""
+    rng = random.Random(seed)
+    run = uuid.uuid4().hex[:6]
+    names = [f"lt_{run}_{k}" for k in range(tables)]
+    messages = [json.dumps(make_payload(rng, columns, rows, names[k % tables])).encode("utf-8")
+                for k in range(max(variants, tables))]
+    return messages, names
+
+
+def produce(topic, messages, count, rate):
+    """Отправляет count сообщений; rate - сообщений в секунду (0 - без ограничения)."""
+    start = time.perf_counter()
+    for i in range(count):
+        if rate:
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        topic.produce(messages[i % len(messages)])
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run(messages=20_000, tables=3, columns=8, rows=10, partitions=4, rate=0,
+        batch_rows=BATCH_MAX_ROWS, linger_ms=BATCH_LINGER_MS, url=None, decoder=DECODER):
+    """Прогоняет messages сообщений через poll_into/MicroBatcher в SQLite
+    (или в Postgres по url) и возвращает сводку."""
+    topic = FakeTopic(partitions=partitions)
+    consumer = FakeConsumer(topic)
+    payloads, names = build_messages(tables, columns, rows)
+
+    if url:
+        import psycopg2
+        conn = psycopg2.connect(url)
+        schema = SchemaCache()
+        write = functools.partial(write_rows, schema=schema)
+        write_each = functools.partial(write_rows, schema=schema, allow_widen=False)
+    else:
+        conn = SqliteTarget()
+        schema = None
+        write = write_each = conn.write
+    batcher = MicroBatcher(conn, write, batch_rows, BATCH_MAX_BYTES, linger_ms, schema=schema,
+                           write_each=write_each)
+    decode = get_decoder(decoder)
+
+    producer = threading.Thread(target=produce, args=(topic, payloads, messages, rate), daemon=True)
+    start = time.perf_counter()
+    producer.start()
+    try:
+        while consumer.committed_total() < messages:
+            poll_into(consumer, batcher, decode)
+            if batcher.should_flush() or (not producer.is_alive() and len(batcher)):
+                commit_offsets(consumer, batcher.flush())
+        elapsed = time.perf_counter() - start
+    finally:
+        if url:
+            conn.rollback()
+            with conn.cursor() as cur:
+                for name in names:
+                    cur.execute(f'DROP TABLE IF EXISTS "{name}"')
+            conn.commit()
+        conn.close()
+
+    return {
+        "messages": messages,
+        "rows": messages * rows,
+        "seconds": elapsed,
+        "msgs_per_sec": messages / elapsed,
+        "rows_per_sec": messages * rows / elapsed,
+        "p50_ms": percentile(consumer.latencies, 0.5) * 1000,
+        "p99_ms": percentile(consumer.latencies, 0.99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон ETL без Kafka и Postgres")
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--tables", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--columns", type=int, nargs="+", default=[4, 32])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1, 50])
+    parser.add_argument("--partitions", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=0, help="сообщений/с от продюсера (0 - максимум)")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_MAX_ROWS)
+    parser.add_argument("--linger-ms", type=int, default=BATCH_LINGER_MS)
+    parser.add_argument("--decoder", default=DECODER)
+    parser.add_argument("--url", default=None, help="Postgres вместо SQLite в памяти")
+    args = parser.parse_args()
+
+    print(f"{'таблиц':>6} {'колонок':>7} {'строк':>6} {'сообщ./с':>10} {'строк/с':>10} "
+          f"{'p50, мс':>8} {'p99, мс':>8}")
+    for tables in args.tables:
+        for columns in args.columns:
+            for rows in args.rows:
+                r = run(args.messages, tables, columns, rows, args.partitions, args.rate,
+                        args.batch_rows, args.linger_ms, args.url, args.decoder)
+                print(f"{tables:>6} {columns:>7} {rows:>6} {r['msgs_per_sec']:>10.0f} "
+                      f"{r['rows_per_sec']:>10.0f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
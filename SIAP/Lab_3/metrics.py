@@ -0,0 +1,197 @@
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .config import METRICS_ENABLED, METRICS_PORT, METRICS_LOG_INTERVAL
+
+log = logging.getLogger(__name__)
+
+# Границы корзин: время этапов от 10 мкс до ~30 с по четыре на порядок,
+# размер пачки в строках - по порядкам
+TIME_BUCKETS = tuple(10 ** (e / 4) for e in range(-20, 7))
+ROW_BUCKETS = (1, 10, 100, 1000, 10_000, 100_000, 1_000_000)
+STAGES = ("deserialize", "prepare", "ensure_table", "insert", "commit", "offset_commit")
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами; квантили - по верхней
+    границе корзины, этого хватает, чтобы видеть порядок величин."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return self.bounds[i] if i < len(self.bounds) else float("inf")
+        return float("inf")
+
+    def snapshot(self):
+        return {"count": self.count, "sum": self.total,
+                "p50": self.quantile(0.5), "p99": self.quantile(0.99)}
+
+
+class _Timer:
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+
+
+_DISABLED = nullcontext()
+
+
+class Metrics:
+    """Счётчики, гистограммы этапов и лаг по партициям.
+
+    Выключенные метрики стоят одну проверку флага на вызов: timer()
+    отдаёт общий пустой контекст, остальные методы сразу возвращаются.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.started = time.monotonic()
+        self.counters = Counter()
+        self.errors = Counter()
+        self.stages = {s: Histogram(TIME_BUCKETS) for s in STAGES}
+        self.batch_rows = Histogram(ROW_BUCKETS)
+        self.lag = {}
+
+    def inc(self, name, n=1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] += n
+
+    def error(self, exc):
+        if self.enabled:
+            with self._lock:
+                self.errors[type(exc).__name__] += 1
+
+    def observe(self, stage, seconds):
+        if self.enabled:
+            with self._lock:
+                self.stages.setdefault(stage, Histogram(TIME_BUCKETS)).observe(seconds)
+
+    def timer(self, stage):
+        return _Timer(self, stage) if self.enabled else _DISABLED
+
+    def batch(self, rows):
+        if self.enabled:
+            with self._lock:
+                self.batch_rows.observe(rows)
+
+    def set_lag(self, tp, lag):
+        if self.enabled:
+            with self._lock:
+                self.lag[f"{tp.topic}[{tp.partition}]"] = lag
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = max(time.monotonic() - self.started, 1e-9)
+            return {
+                "uptime": elapsed,
+                "messages_per_sec": self.counters["messages"] / elapsed,
+                "rows_per_sec": self.counters["rows"] / elapsed,
+                "counters": dict(self.counters),
+                "errors": dict(self.errors),
+                "stages": {s: h.snapshot() for s, h in self.stages.items()},
+                "batch_rows": self.batch_rows.snapshot(),
+                "lag": dict(self.lag),
+            }
+
+    def render(self):
+        """Снимок в текстовом формате Prometheus."""
+        snap = self.snapshot()
+        lines = [f"etl_{name}_total {value}" for name, value in snap["counters"].items()]
+        lines += [f'etl_errors_total{{type="{t}"}} {n}' for t, n in snap["errors"].items()]
+        with self._lock:
+            hists = [("etl_stage_seconds", f'stage="{s}",', h) for s, h in self.stages.items()]
+            hists.append(("etl_batch_rows", "", self.batch_rows))
+            for name, label, h in hists:
+                cumulative = 0
+                for bound, c in zip(h.bounds + (float("inf"),), h.counts):
+                    cumulative += c
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f'{name}_bucket{{{label}le="{le}"}} {cumulative}')
+                lines.append(f"{name}_sum{{{label.rstrip(',')}}} {h.total}")
+                lines.append(f"{name}_count{{{label.rstrip(',')}}} {h.count}")
+        lines += [f'etl_consumer_lag{{partition="{p}"}} {lag}' for p, lag in snap["lag"].items()]
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics(METRICS_ENABLED)
+
+
+def serve(port, registry=metrics):
+    """Отдаёт метрики по HTTP на localhost: /metrics - текст, /metrics.json - JSON."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.endswith(".json"):
+                body, ctype = json.dumps(registry.snapshot()), "application/json"
+            else:
+                body, ctype = registry.render(), "text/plain; version=0.0.4"
+            body = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def log_snapshots(interval, registry=metrics, stop=None):
+    """Раз в interval секунд пишет снимок метрик в лог (в фоновом потоке)."""
+    stop = stop or threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            log.info("metrics %s", json.dumps(registry.snapshot(), ensure_ascii=False))
+
+    threading.Thread(target=loop, name="metrics-log", daemon=True).start()
+    return stop
+
+
+def start(port=METRICS_PORT, interval=METRICS_LOG_INTERVAL):
+    """Включает экспорт по настройкам из config; без METRICS_ENABLED ничего не делает."""
+    if not metrics.enabled:
+        return
+    if port:
+        serve(port)
+    if interval:
+        log_snapshots(interval)
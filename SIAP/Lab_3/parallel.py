@@ -0,0 +1,149 @@
+import argparse
+import functools
+import logging
+import signal
+import threading
+from contextlib import contextmanager
+
+from kafka import ConsumerRebalanceListener
+from psycopg2.pool import ThreadedConnectionPool
+
+from . import metrics as etl_metrics
+from .batching import MicroBatcher
+from .config import (KAFKA_TOPIC, POSTGRES_URL, BATCH_MAX_ROWS, BATCH_MAX_BYTES,
+                     BATCH_LINGER_MS, CONSUMER_WORKERS, PG_POOL_SIZE, DECODER)
+from .consumer_worker import (commit_offsets, create_consumer, create_dead_letter, poll_into,
+                              write_rows)
+from .decoding import get_decoder
+from .schema import SchemaCache
+
+log = logging.getLogger(__name__)
+
+
+class BoundedPool:
+    """Пул соединений, который ждёт свободное соединение, а не падает
+    с PoolError, когда все заняты."""
+
+    def __init__(self, url, size):
+        self.pool = ThreadedConnectionPool(1, size, url)
+        self.slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def connection(self):
+        with self.slots:
+            conn = self.pool.getconn()
+            try:
+                yield conn
+            finally:
+                # Оборванное соединение не возвращаем в оборот
+                self.pool.putconn(conn, close=bool(conn.closed))
+
+    def close(self):
+        self.pool.closeall()
+
+
+class FlushOnRevoke(ConsumerRebalanceListener):
+    """Перед тем как партиции уйдут другому воркеру, дописываем пачку
+    и подтверждаем смещения - новый владелец начнёт ровно с них."""
+
+    def __init__(self, worker):
+        self.worker = worker
+
+    def on_partitions_revoked(self, revoked):
+        if revoked:
+            self.worker.flush()
+
+    def on_partitions_assigned(self, assigned):
+        log.info("%s: партиции %s", self.worker.name, sorted(tp.partition for tp in assigned))
+
+
+class ConsumerWorker(threading.Thread):
+    """Поток со своим KafkaConsumer в общей группе.
+
+    Kafka раздаёт партиции между воркерами группы, а внутри одного
+    воркера сообщения партиции обрабатываются по порядку. Соединение
+    с БД берётся из общего пула только на время сброса пачки.
+    """
+
+    def __init__(self, index, pool, stop, dead_letter=None):
+        super().__init__(name=f"consumer-{index}", daemon=True)
+        self.pool = pool
+        self.stop = stop
+        self.decode = get_decoder(DECODER)
+        self.dead_letter = dead_letter
+        self.schema = SchemaCache()
+        self.batcher = MicroBatcher(None, functools.partial(write_rows, schema=self.schema),
+                                    BATCH_MAX_ROWS, BATCH_MAX_BYTES, BATCH_LINGER_MS,
+                                    schema=self.schema, dead_letter=dead_letter,
+                                    write_each=functools.partial(write_rows, schema=self.schema,
+                                                                 allow_widen=False))
+        self.consumer = None
+
+    def flush(self):
+        if not len(self.batcher):
+            return
+        with self.pool.connection() as conn:
+            offsets = self.batcher.flush(conn)
+        commit_offsets(self.consumer, offsets)
+
+    def run(self):
+        try:
+            with self.pool.connection() as conn:
+                with conn.cursor() as cur:
+                    self.schema.load(cur)
+                conn.commit()
+            self.consumer = create_consumer()
+            self.consumer.subscribe([KAFKA_TOPIC], listener=FlushOnRevoke(self))
+            while not self.stop.is_set():
+                poll_into(self.consumer, self.batcher, self.decode, self.dead_letter)
+                if self.batcher.should_flush():
+                    self.flush()
+            self.flush()
+        except Exception:
+            log.exception("%s остановлен с ошибкой", self.name)
+            self.stop.set()
+        finally:
+            if self.consumer is not None:
+                self.consumer.close(autocommit=False)
+
+
+def run(workers=CONSUMER_WORKERS, pool_size=PG_POOL_SIZE, url=POSTGRES_URL):
+    """Запускает workers потребителей и ждёт SIGINT/SIGTERM или падения одного из них.
+
+    Воркеров больше, чем партиций в топике, запускать бессмысленно -
+    лишние останутся без партиций.
+    """
+    pool = BoundedPool(url, pool_size)
+    dead_letter = create_dead_letter()
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    threads = [ConsumerWorker(i, pool, stop, dead_letter) for i in range(workers)]
+    for t in threads:
+        t.start()
+    try:
+        while not stop.wait(1):
+            pass
+    except KeyboardInterrupt:
+        stop.set()
+    finally:
+        for t in threads:
+            t.join()
+        pool.close()
+        if dead_letter is not None:
+            dead_letter.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Параллельный Kafka -> Postgres ETL")
+    parser.add_argument("--workers", type=int, default=CONSUMER_WORKERS,
+                        help="потоков-потребителей в группе")
+    parser.add_argument("--pool-size", type=int, default=PG_POOL_SIZE,
+                        help="соединений с Postgres на все потоки")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(threadName)s %(message)s")
+    etl_metrics.start()
+    run(args.workers, args.pool_size)
+
+
+if __name__ == "__main__":
+    main()
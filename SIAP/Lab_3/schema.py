@@ -0,0 +1,207 @@
+import re
+from functools import lru_cache
+
+from psycopg2 import errors, sql
+
+from .coltypes import WIDENABLE, batch_type, widen
+
+# Ошибки, после которых кэш схемы таблицы считается устаревшим
+# (таблицу или колонку удалили/изменили в обход воркера, в том числе
+# поменяли тип так, что значения пачки в него больше не помещаются)
+SCHEMA_ERRORS = (errors.UndefinedTable, errors.UndefinedColumn,
+                 errors.DuplicateColumn, errors.DatatypeMismatch,
+                 errors.InvalidTextRepresentation, errors.InvalidDatetimeFormat,
+                 errors.NumericValueOutOfRange)
+
+
+@lru_cache(maxsize=4096)
+def sanitize_identifier(name: str) -> str:
+    """Оставляем только буквы/цифры/подчёркивание, остальное -> '_'."""
+    safe = re.sub(r"[^0-9a-zA-Z_]", "_", name)
+    if not safe:
+        safe = "t"
+    if safe[0].isdigit():
+        safe = f"t_{safe}"
+    return safe
+
+
+@lru_cache(maxsize=1024)
+def sanitize_columns(columns: tuple) -> tuple:
+    return tuple(sanitize_identifier(c) for c in columns)
+
+
+@lru_cache(maxsize=1024)
+def insert_target(table: str, columns: tuple) -> sql.Composed:
+    """'"table" ("a", "b")' - общая часть INSERT и COPY, собирается один раз."""
+    return sql.SQL("{} ({})").format(
+        sql.Identifier(table),
+        sql.SQL(", ").join(map(sql.Identifier, columns))
+    )
+
+
+@lru_cache(maxsize=1024)
+def insert_statement(table: str, columns: tuple, strategy: str) -> sql.Composed:
+    """Готовый запрос вставки для сигнатуры (таблица, колонки, способ)."""
+    target = insert_target(table, columns)
+    if strategy == "copy":
+        return sql.SQL("COPY {} FROM STDIN").format(target)
+    if strategy == "values":
+        return sql.SQL("INSERT INTO {} VALUES %s").format(target)
+    if strategy == "batch":
+        return sql.SQL("INSERT INTO {} VALUES ({})").format(
+            target,
+            sql.SQL(", ").join(sql.Placeholder() * len(columns))
+        )
+    raise ValueError(f"unknown insert strategy: {strategy}")
+
+
+class SchemaCache:
+    """Известные таблицы и колонки текущей схемы БД.
+
+    DDL выполняется только для таблиц и колонок, которых ещё нет в кэше:
+    новая таблица - CREATE TABLE, новые колонки в сообщении - ALTER TABLE
+    ADD COLUMN, значения, не влезающие в тип колонки, - ALTER COLUMN TYPE.
+    Изменения, сделанные в незакоммиченной транзакции, держатся отдельно
+    и попадают в кэш только после commit() - при откате БД забывает DDL,
+    и кэш должен забыть его тоже.
+
+    hints - типы, выведенные для новых колонок по всей пачке. Они
+    переживают откат: когда пачка пишется по одному сообщению
+    (allow_widen=False), новые колонки создаются с типами всей пачки,
+    а не первого сообщения, так что схема не зависит от порядка.
+    """
+
+    def __init__(self):
+        self.tables = {}
+        self.pending = {}
+        self.hints = {}
+
+    def load(self, cur) -> None:
+        """Заполняет кэш из information_schema одним запросом."""
+        cur.execute(
+            "SELECT table_name, column_name, data_type FROM information_schema.columns "
+            "WHERE table_schema = current_schema()"
+        )
+        self.tables = {}
+        for table, column, data_type in cur.fetchall():
+            self.tables.setdefault(table, {})[column] = data_type
+        self.pending = {}
+
+    def columns(self, table: str) -> dict:
+        known = self.tables.get(table)
+        if table in self.pending:
+            known = {**(known or {}), **self.pending[table]}
+        return known
+
+    def ensure(self, cur, table_name: str, columns, values=None, outliers: float = 0.0,
+               allow_widen: bool = True) -> tuple:
+        """Создаёт таблицу или недостающие колонки; возвращает безопасные имена.
+
+        values - данные пачки по колонкам (в порядке columns). Без них все
+        новые колонки TEXT, как раньше. С ними тип новой колонки выводится
+        из значений, а типизированные колонки расширяются, если значения
+        пачки в них не помещаются. Доля значений до outliers считается
+        выбросами и на тип не влияет (см. coltypes.batch_type); без
+        allow_widen существующие колонки не расширяются вовсе.
+        """
+        safe_table = sanitize_identifier(table_name)
+        safe_cols = sanitize_columns(tuple(columns))
+        known = self.columns(safe_table)
+        observed = {}
+        if values is not None:
+            # Тип выводится только там, где он может что-то изменить:
+            # для новых колонок и для тех, что ещё можно расширить
+            observed = {c: batch_type(v, outliers) for c, v in zip(safe_cols, values)
+                        if known is None or c not in known
+                        or (allow_widen and known[c] in WIDENABLE)}
+
+        hints = self.hints.setdefault(safe_table, {})
+        if allow_widen:
+            hints.update((c, t) for c, t in observed.items()
+                         if t is not None and (known is None or c not in known))
+
+        def new_type(column):
+            if not allow_widen and column in hints:
+                return hints[column]
+            return observed.get(column) or "text"
+
+        if known is None:
+            col_defs = [sql.SQL("{} {}").format(sql.Identifier(c), sql.SQL(new_type(c)))
+                        for c in safe_cols]
+            cur.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} ({});").format(
+                sql.Identifier(safe_table),
+                sql.SQL(", ").join(col_defs)
+            ))
+            # Таблица могла существовать и раньше (кэш сброшен или её создал
+            # другой воркер) - узнаём её настоящие колонки и типы, чтобы
+            # недостающие колонки пачки добавились ниже
+            known = self.pending[safe_table] = self._read(cur, safe_table)
+
+        missing = [c for c in dict.fromkeys(safe_cols) if c not in known]
+        if missing:
+            cur.execute(sql.SQL("ALTER TABLE {} {};").format(
+                sql.Identifier(safe_table),
+                sql.SQL(", ").join(
+                    sql.SQL("ADD COLUMN IF NOT EXISTS {} {}").format(sql.Identifier(c),
+                                                                     sql.SQL(new_type(c)))
+                    for c in missing)
+            ))
+            self.pending.setdefault(safe_table, {}).update({c: new_type(c) for c in missing})
+            known = self.columns(safe_table)
+
+        if allow_widen and any(widen(known[c], t) != known[c]
+                               for c, t in observed.items() if known[c] in WIDENABLE):
+            self._widen(cur, safe_table, observed)
+        return safe_table, safe_cols
+
+    def _read(self, cur, table: str) -> dict:
+        cur.execute(
+            "SELECT column_name, data_type FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = %s", (table,)
+        )
+        return dict(cur.fetchall())
+
+    def _widen(self, cur, table: str, observed: dict) -> None:
+        """Расширяет типы колонок до тех, в которые помещаются значения пачки.
+
+        Таблица блокируется до конца транзакции, а типы перечитываются уже
+        под блокировкой: другой воркер мог успеть расширить колонку, и
+        сужать её обратно по устаревшему кэшу нельзя.
+        """
+        cur.execute(sql.SQL("LOCK TABLE {} IN ACCESS EXCLUSIVE MODE;").format(sql.Identifier(table)))
+        actual = self._read(cur, table)
+        changes = {}
+        for column, seen in observed.items():
+            current = actual.get(column)
+            if current in WIDENABLE and widen(current, seen) != current:
+                changes[column] = widen(current, seen)
+        if changes:
+            cur.execute(sql.SQL("ALTER TABLE {} {};").format(
+                sql.Identifier(table),
+                sql.SQL(", ").join(
+                    sql.SQL("ALTER COLUMN {0} TYPE {1} USING {0}::{1}").format(
+                        sql.Identifier(c), sql.SQL(t))
+                    for c, t in changes.items())
+            ))
+        self.pending[table] = {**actual, **changes}
+
+    def invalidate(self, table_name: str = None) -> None:
+        """Забывает таблицу (или весь кэш): при следующей записи DDL повторится."""
+        if table_name is None:
+            self.tables.clear()
+            self.pending.clear()
+            return
+        safe_table = sanitize_identifier(table_name)
+        self.tables.pop(safe_table, None)
+        self.pending.pop(safe_table, None)
+
+    def commit(self) -> None:
+        for table, cols in self.pending.items():
+            self.tables.setdefault(table, {}).update(cols)
+            # Созданным колонкам подсказки больше не нужны
+            for column in cols:
+                self.hints.get(table, {}).pop(column, None)
+        self.pending = {}
+
+    def rollback(self) -> None:
+        self.pending = {}
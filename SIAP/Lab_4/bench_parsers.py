@@ -0,0 +1,84 @@
+import os
+import glob
+import time
+import random
+import argparse
+
+from parsers import available_backends, parse_details, find_detail_links
+
+
+def sample_details_page(rng, rows=200, mmsi_in_table=True):
+    """Страница деталей, похожая на настоящую: меню, скрипты, большие таблицы"""
+    vid = rng.randint(1000, 9_999_999)
+    noise = ''.join(f'<li><a href="/news/{i}">Новость {i}</a></li>' for i in range(rows))
+    table = ''.join(f'<tr><td>Поле {i}</td><td>{rng.random():.6f}</td></tr>' for i in range(rows))
+    mmsi = rng.randint(100_000_000, 999_999_999)
+    mmsi_row = f'<tr><th>MMSI</th><td><b>{mmsi}</b></td></tr>' if mmsi_in_table else ''
+    footer = '' if mmsi_in_table else f'<p>Позывной ABCD, MMSI: {mmsi}</p>'
+    return (f'<html><head><script>var MMSI = 0;</script><style>h1{{}}</style></head><body>'
+            f'<ul>{noise}</ul><h1> VESSEL {vid} </h1><h2>Bulk Carrier, IMO {vid}</h2>'
+            f'<table>{table}<tr><td>Vessel type</td><td>Bulk Carrier</td></tr>{mmsi_row}</table>'
+            f'{footer}</body></html>')
+
+
+def sample_search_page(rng, links=1, rows=300):
+    noise = ''.join(f'<tr><td><a href="/ports/{i}">Порт {i}</a></td></tr>' for i in range(rows))
+    found = ''.join(f'<a href="/vessels/details/{rng.randint(1, 10**7)}">Судно</a>' for _ in range(links))
+    return f'<html><body><table>{noise}</table><div class="results">{found}</div></body></html>'
+
+
+def load_pages(paths, count, seed=0):
+    """Сохранённые страницы (*.html) или сгенерированные, если их нет.
+    Страницы с /vessels/details/ в имени или содержимым h1 считаются страницами деталей"""
+    files = [f for p in paths for f in (sorted(glob.glob(os.path.join(p, '*.html')))
+                                        if os.path.isdir(p) else [p])]
+    if files:
+        pages = []
+        for name in files:
+            with open(name, encoding='utf-8', errors='replace') as f:
+                html = f.read()
+            pages.append(('details' if '<h1' in html else 'search', html))
+        return pages
+    rng = random.Random(seed)
+    pages = []
+    for i in range(count):
+        if i % 2:
+            pages.append(('search', sample_search_page(rng, links=1 + i % 3)))
+        else:
+            pages.append(('details', sample_details_page(rng, mmsi_in_table=i % 4 == 0)))
+    return pages
+
+
+def bench(backend, pages, repeat):
+    best = float('inf')
+    results = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [parse_details(html, backend) if kind == 'details' else find_detail_links(html, backend)
+                   for kind, html in pages]
+        best = min(best, time.perf_counter() - start)
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Скорость разбора страниц разными разборщиками")
+    parser.add_argument('pages', nargs='*', help="сохранённые .html или каталоги с ними")
+    parser.add_argument('--count', type=int, default=200, help="сколько страниц сгенерировать")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages, args.count)
+    mb = sum(len(html.encode('utf-8')) for _, html in pages) / 1e6
+    print(f"Страниц: {len(pages)}, {mb:.1f} МБ")
+    reference = None
+    for backend in available_backends():
+        elapsed, results = bench(backend, pages, args.repeat)
+        if reference is None:
+            reference = results
+        same = sum(r == ref for r, ref in zip(results, reference))
+        print(f"{backend:>11}: {elapsed * 1000 / len(pages):7.2f} мс/стр, {mb / elapsed:6.1f} МБ/с, "
+              f"совпало с {available_backends()[0]}: {same}/{len(pages)}")
+
+
+if __name__ == "__main__":
+    main()
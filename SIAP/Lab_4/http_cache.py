@@ -0,0 +1,70 @@
+import os
+import json
+import time
+import hashlib
+
+DEFAULT_CACHE_DIR = '.http_cache'
+DEFAULT_TTL = 24 * 3600
+
+
+class HttpCache:
+    """Дисковый кэш ответов по URL: один JSON-файл на страницу.
+
+    Пока запись моложе ttl секунд, страница берётся с диска без запроса.
+    Устаревшая запись перепроверяется условным запросом (If-None-Match /
+    If-Modified-Since): на 304 тело берётся из кэша, а срок продлевается.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL):
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key[:2], key + '.json')
+
+    def get(self, url):
+        try:
+            with open(self._path(url), encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get('url') == url else None
+
+    def is_fresh(self, entry):
+        return time.time() - entry['fetched'] < self.ttl
+
+    @staticmethod
+    def validators(entry):
+        """Заголовки условного запроса для перепроверки записи."""
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def put(self, url, body, headers=None):
+        headers = headers or {}
+        self._write(url, {
+            'url': url,
+            'fetched': time.time(),
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'body': body,
+        })
+
+    def refresh(self, url, entry):
+        """Ответ 304: содержимое не изменилось, продлеваем срок записи."""
+        entry['fetched'] = time.time()
+        self._write(url, entry)
+
+    def _write(self, url, entry):
+        path = self._path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Пишем во временный файл и подменяем, чтобы прерванный запуск не оставил битую запись
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp, path)
@@ -0,0 +1,308 @@
+import csv
+import json
+import time
+import asyncio
+import contextvars
+from bisect import bisect_left
+from collections import Counter
+from contextlib import nullcontext
+from datetime import datetime
+
+import aiohttp
+
+# Корзины времени от 0.1 мс до ~5 мин, по 20 на порядок: квантиль точен до ~12%,
+# а память не растёт с числом ссылок
+TIME_BUCKETS = tuple(10 ** (e / 20) for e in range(-80, 50))
+# throttle_wait - ожидание темпа хоста, pool_wait - свободного соединения, ttfb - от
+# отправки запроса до заголовков ответа, request - попытка целиком, link - ссылка
+# со всеми запросами и паузами между повторами
+PHASES = ('throttle_wait', 'pool_wait', 'dns', 'connect', 'ttfb', 'download', 'request', 'parse',
+          'link')
+LINK_PHASES = ('throttle_wait', 'pool_wait', 'dns', 'connect', 'ttfb', 'download', 'parse')
+OUTCOMES = ('found', 'not_found', 'multiple', 'failed')
+
+# Времена текущей ссылки: link_worker задаёт словарь, fetch_html и разбор дописывают
+_current_link = contextvars.ContextVar('current_link', default=None)
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами; квантили - по верхней
+    границе корзины, этого хватает, чтобы видеть порядок величин."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self):
+        return {'count': self.count,
+                'mean': round(self.total / self.count, 6) if self.count else 0.0,
+                'p50': round(self.quantile(0.5), 6), 'p95': round(self.quantile(0.95), 6),
+                'max': round(self.max, 6)}
+
+
+class _Timer:
+    __slots__ = ('metrics', 'phase', 'start')
+
+    def __init__(self, metrics, phase):
+        self.metrics = metrics
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.phase, time.perf_counter() - self.start)
+
+
+_DISABLED = nullcontext()
+
+
+class _LinkTimer:
+    """Контекст обработки одной ссылки: собирает времена её запросов и разбора,
+    на выходе пишет строку в журнал ссылок"""
+
+    def __init__(self, metrics, url):
+        self.metrics = metrics
+        self.url = url
+        self.timings = {'outcome': 'failed', 'requests': 0}
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.token = _current_link.set(self.timings)
+        return self.timings
+
+    def __exit__(self, *exc):
+        _current_link.reset(self.token)
+        self.metrics.finish_link(self.url, self.timings, time.perf_counter() - self.start)
+
+
+class ScrapeMetrics:
+    """Счётчики, гистограммы этапов запроса и срез очереди во времени.
+
+    Всё работает в одном цикле событий, поэтому без блокировок. Выключенные
+    метрики стоят одну проверку флага на вызов.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.link_log = None
+        self.reset()
+
+    def reset(self):
+        self.started = time.monotonic()
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self.counters = Counter()
+        self.statuses = Counter()
+        self.errors = Counter()
+        self.link_errors = Counter()
+        self.phases = {p: Histogram(TIME_BUCKETS) for p in PHASES}
+        self.inflight = 0
+        self.max_inflight = 0
+        self.max_queue = 0
+        self.timeline = []
+
+    def inc(self, name, n=1):
+        if self.enabled:
+            self.counters[name] += n
+
+    def status(self, code):
+        if self.enabled:
+            self.statuses[code] += 1
+
+    def error(self, exc, link=False):
+        """Исключение попытки запроса или (link=True) причина неудачи ссылки"""
+        if self.enabled:
+            (self.link_errors if link else self.errors)[type(exc).__name__] += 1
+
+    def observe(self, phase, seconds):
+        if not self.enabled:
+            return
+        self.phases[phase].observe(seconds)
+        link = _current_link.get()
+        if link is not None and phase in LINK_PHASES:
+            link[phase] = link.get(phase, 0.0) + seconds
+
+    def timer(self, phase):
+        return _Timer(self, phase) if self.enabled else _DISABLED
+
+    # ----- запросы -----
+
+    def request_started(self):
+        """Отмечает попытку запроса; возвращает время начала (None - метрики выключены)"""
+        if not self.enabled:
+            return None
+        self.inflight += 1
+        self.max_inflight = max(self.max_inflight, self.inflight)
+        self.counters['requests'] += 1
+        link = _current_link.get()
+        if link is not None:
+            link['requests'] += 1
+        return time.perf_counter()
+
+    def request_finished(self, start):
+        if start is None:
+            return
+        self.inflight -= 1
+        self.observe('request', time.perf_counter() - start)
+
+    def trace_config(self):
+        """TraceConfig для aiohttp: ожидание соединения, DNS, подключение и TTFB.
+        Времена попадают в гистограммы и в текущую ссылку"""
+        def now():
+            return time.perf_counter()
+
+        async def on_request_start(session, ctx, params):
+            ctx.start = now()
+            ctx.setup = 0.0
+
+        async def on_queued_start(session, ctx, params):
+            ctx.queued = now()
+
+        async def on_queued_end(session, ctx, params):
+            self._phase(ctx, 'pool_wait', ctx.queued)
+
+        async def on_dns_start(session, ctx, params):
+            ctx.dns = now()
+
+        async def on_dns_end(session, ctx, params):
+            self._phase(ctx, 'dns', ctx.dns)
+
+        async def on_connect_start(session, ctx, params):
+            ctx.connect = now()
+            ctx.dns_before = getattr(ctx, 'dns_total', 0.0)
+
+        async def on_connect_end(session, ctx, params):
+            # Подключение включает разрешение имени - его вычитаем
+            dns = getattr(ctx, 'dns_total', 0.0) - ctx.dns_before
+            self._phase(ctx, 'connect', ctx.connect + dns)
+
+        async def on_request_end(session, ctx, params):
+            # Время до заголовков ответа без ожидания пула и подключения
+            self._phase(ctx, 'ttfb', ctx.start + ctx.setup)
+
+        trace = aiohttp.TraceConfig()
+        trace.on_request_start.append(on_request_start)
+        trace.on_connection_queued_start.append(on_queued_start)
+        trace.on_connection_queued_end.append(on_queued_end)
+        trace.on_dns_resolvehost_start.append(on_dns_start)
+        trace.on_dns_resolvehost_end.append(on_dns_end)
+        trace.on_connection_create_start.append(on_connect_start)
+        trace.on_connection_create_end.append(on_connect_end)
+        trace.on_request_end.append(on_request_end)
+        return trace
+
+    def _phase(self, ctx, phase, since):
+        seconds = time.perf_counter() - since
+        if phase != 'ttfb':
+            ctx.setup += seconds
+            if phase == 'dns':
+                ctx.dns_total = getattr(ctx, 'dns_total', 0.0) + seconds
+        self.observe(phase, seconds)
+
+    # ----- ссылки -----
+
+    def link(self, url):
+        return _LinkTimer(self, url)
+
+    def finish_link(self, url, timings, seconds):
+        if not self.enabled:
+            return
+        self.phases['link'].observe(seconds)
+        self.counters[timings['outcome']] += 1
+        self.counters['links'] += 1
+        if self.link_log is not None:
+            self.link_log.writerow([url, timings['outcome'], timings['requests'], round(seconds, 4)]
+                                   + [round(timings.get(p, 0.0), 4) for p in LINK_PHASES])
+
+    def open_link_log(self, path):
+        """Журнал по ссылкам: исход, число запросов и времена этапов"""
+        self._log_file = open(path, 'w', newline='', encoding='utf-8')
+        self.link_log = csv.writer(self._log_file)
+        self.link_log.writerow(['Link', 'outcome', 'requests', 'total'] + list(LINK_PHASES))
+
+    def close_link_log(self):
+        if self.link_log is not None:
+            self._log_file.close()
+            self.link_log = None
+
+    # ----- срез во времени и отчёт -----
+
+    async def sample(self, queue, interval=1.0):
+        """Раз в interval секунд записывает глубину очереди, запросы в полёте
+        и число готовых ссылок; работает, пока задачу не отменят"""
+        while True:
+            self.sample_once(queue)
+            await asyncio.sleep(interval)
+
+    def sample_once(self, queue):
+        depth = queue.qsize()
+        self.max_queue = max(self.max_queue, depth)
+        self.timeline.append({'t': round(time.monotonic() - self.started, 3), 'queue': depth,
+                              'inflight': self.inflight, 'links': self.counters['links'],
+                              'requests': self.counters['requests']})
+
+    def report(self, **extra):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        c = self.counters
+        return {
+            'started': self.started_at,
+            'elapsed': round(elapsed, 3),
+            'links': {'processed': c['links'], **{o: c[o] for o in OUTCOMES}},
+            'throughput': {'links_per_s': round(c['links'] / elapsed, 2),
+                           'requests_per_s': round(c['requests'] / elapsed, 2)},
+            'requests': c['requests'],
+            'retries': c['retries'],
+            'throttled': c['throttled'],
+            'cache': {'fresh': c['cache_fresh'], 'revalidated': c['cache_revalidated']},
+            'statuses': {str(k): v for k, v in sorted(self.statuses.items())},
+            'errors': dict(self.errors),
+            'link_errors': dict(self.link_errors),
+            'latency': {p: h.snapshot() for p, h in self.phases.items() if h.count},
+            'concurrency': {'max_inflight': self.max_inflight, 'max_queue': self.max_queue},
+            **extra,
+            'timeline': self.timeline,
+        }
+
+    def write_report(self, path, **extra):
+        report = self.report(**extra)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        return report
+
+
+def format_summary(report):
+    """Короткая сводка отчёта для консоли"""
+    latency = report['latency']
+
+    def ms(phase, q):
+        return f"{latency[phase][q] * 1000:.0f}" if phase in latency else '-'
+
+    return (f"{report['throughput']['links_per_s']} ссылок/с, "
+            f"{report['throughput']['requests_per_s']} запросов/с; "
+            f"запрос p50/p95 {ms('request', 'p50')}/{ms('request', 'p95')} мс, "
+            f"ссылка p50/p95 {ms('link', 'p50')}/{ms('link', 'p95')} мс; "
+            f"повторов {report['retries']}, ответов 429/503 {report['throttled']}")
+
+
+# Общие метрики процесса; process_links_async включает их на время запуска
+metrics = ScrapeMetrics()
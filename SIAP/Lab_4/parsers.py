@@ -0,0 +1,277 @@
+import re
+import asyncio
+import concurrent.futures
+import multiprocessing as mp
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:
+    try:
+        from selectolax.parser import HTMLParser
+    except ImportError:
+        HTMLParser = None
+
+BACKENDS = ('bs4', 'lxml', 'selectolax')
+
+DETAILS_HREF = re.compile(r'/vessels/details/\d+')
+MMSI_TEXT = re.compile(r'MMSI[:\s]*(\d+)', re.IGNORECASE)
+SKIP_TEXT = ('script', 'style')
+XML_DECLARATION = re.compile(r'^\s*<\?xml[^>]*\?>')
+
+
+def available_backends():
+    return [b for b in BACKENDS
+            if b == 'bs4' or (b == 'lxml' and lxml) or (b == 'selectolax' and HTMLParser)]
+
+
+def default_backend():
+    """Самый быстрый из установленных разборщиков"""
+    for name in ('selectolax', 'lxml'):
+        if name in available_backends():
+            return name
+    return 'bs4'
+
+
+def mmsi_from_text(texts, window=64):
+    """Ищет 'MMSI: 123' в потоке текстовых узлов, не склеивая страницу целиком.
+    Хвост предыдущих узлов сохраняется: метка и число могут быть в разных узлах"""
+    tail = ''
+    for text in texts:
+        chunk = tail + text
+        m = MMSI_TEXT.search(chunk)
+        # Если совпадение упёрлось в конец, цифры могут продолжаться в следующем узле
+        if m and m.end() < len(chunk):
+            return m.group(1)
+        tail = chunk[-window:]
+    m = MMSI_TEXT.search(tail)
+    return m.group(1) if m else None
+
+
+def ship_from_parts(h1, h2, rows, texts):
+    """Собирает данные судна из заголовков, строк таблиц (метка, значение)
+    и ленивого потока текста страницы - общая часть всех разборщиков"""
+    ship_data = {}
+
+    # Название из h1
+    if h1:
+        ship_data['Name'] = h1
+
+    # IMO и тип из h2
+    if h2 is not None:
+        imo_match = re.search(r'IMO\s*(\d+)', h2, re.IGNORECASE)
+        if imo_match:
+            ship_data['IMO'] = imo_match.group(1)
+
+        type_candidate = h2.split(',')[0].strip()
+        if type_candidate and 'IMO' not in type_candidate.upper():
+            ship_data['Type'] = type_candidate
+
+    # MMSI, IMO и тип в таблицах
+    for label, value in rows:
+        label = label.lower()
+        if 'mmsi' in label and 'MMSI' not in ship_data:
+            mmsi_match = re.search(r'\d+', value)
+            if mmsi_match:
+                ship_data['MMSI'] = mmsi_match.group(0)
+
+        if 'imo' in label and 'IMO' not in ship_data:
+            imo_match = re.search(r'\d+', value)
+            if imo_match:
+                ship_data['IMO'] = imo_match.group(0)
+
+        if ('type' in label or 'тип' in label) and 'Type' not in ship_data:
+            ship_data['Type'] = value
+
+    # MMSI в тексте страницы - только если в таблицах его не было
+    if 'MMSI' not in ship_data:
+        mmsi = mmsi_from_text(texts())
+        if mmsi:
+            ship_data['MMSI'] = mmsi
+
+    if ship_data.get('Name') or ship_data.get('IMO'):
+        return {
+            'Name': ship_data.get('Name', 'N/A'),
+            'IMO': ship_data.get('IMO', 'N/A'),
+            'MMSI': ship_data.get('MMSI', 'N/A'),
+            'Type': ship_data.get('Type', 'N/A')
+        }
+    return None
+
+
+# ----- BeautifulSoup -----
+
+def _bs4_details(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    h1 = soup.find('h1')
+    h2 = soup.find('h2')
+
+    def rows():
+        for table in soup.find_all('table'):
+            for row in table.find_all('tr'):
+                cells = row.find_all(['td', 'th'])
+                if len(cells) >= 2:
+                    yield cells[0].get_text(strip=True), cells[1].get_text(strip=True)
+
+    return ship_from_parts(h1.get_text(strip=True) if h1 else None,
+                           h2.get_text() if h2 else None, rows(), lambda: soup.strings)
+
+
+def _bs4_links(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    return [a['href'] for a in soup.find_all('a', href=DETAILS_HREF)]
+
+
+# ----- lxml -----
+
+def _lxml_text(el, strip=False):
+    if strip:
+        return ''.join(t.strip() for t in el.itertext())
+    return ''.join(el.itertext())
+
+
+def _lxml_root(html):
+    """Корень документа или None для пустой страницы. lxml не принимает
+    str с объявлением кодировки XML - его убираем, текст уже декодирован"""
+    if isinstance(html, str):
+        html = XML_DECLARATION.sub('', html, count=1)
+    if not html.strip():
+        return None
+    try:
+        return lxml.html.fromstring(html)
+    except lxml.etree.ParserError:
+        # "Document is empty": в странице нет ни одного элемента
+        return None
+
+
+def _lxml_details(html):
+    root = _lxml_root(html)
+    if root is None:
+        return ship_from_parts(None, None, (), lambda: iter(()))
+    h1 = next(root.iter('h1'), None)
+    h2 = next(root.iter('h2'), None)
+
+    def rows():
+        for row in root.iterfind('.//table//tr'):
+            cells = list(row.iter('td', 'th'))
+            if len(cells) >= 2:
+                yield _lxml_text(cells[0], True), _lxml_text(cells[1], True)
+
+    def texts():
+        for el in root.iter():
+            if el.tag in SKIP_TEXT or not isinstance(el.tag, str):
+                if el.tail:
+                    yield el.tail
+                continue
+            if el.text:
+                yield el.text
+            if el.tail:
+                yield el.tail
+
+    return ship_from_parts(_lxml_text(h1, True) if h1 is not None else None,
+                           _lxml_text(h2) if h2 is not None else None, rows(), texts)
+
+
+def _lxml_links(html):
+    root = _lxml_root(html)
+    if root is None:
+        return []
+    return [a.get('href') for a in root.iter('a') if DETAILS_HREF.search(a.get('href') or '')]
+
+
+# ----- selectolax -----
+
+def _selectolax_details(html):
+    tree = HTMLParser(html)
+    h1 = tree.css_first('h1')
+    h2 = tree.css_first('h2')
+
+    def rows():
+        for row in tree.css('table tr'):
+            cells = row.css('td, th')
+            if len(cells) >= 2:
+                yield (cells[0].text(deep=True, separator='', strip=True),
+                       cells[1].text(deep=True, separator='', strip=True))
+
+    def texts():
+        body = tree.root
+        if body is None:
+            return
+        for node in body.traverse(include_text=True):
+            if node.tag == '-text' and (node.parent is None or node.parent.tag not in SKIP_TEXT):
+                yield node.text_content
+
+    return ship_from_parts(h1.text(deep=True, separator='', strip=True) if h1 else None,
+                           h2.text(deep=True) if h2 else None, rows(), texts)
+
+
+def _selectolax_links(html):
+    tree = HTMLParser(html)
+    return [a.attributes['href'] for a in tree.css('a[href*="/vessels/details/"]')
+            if DETAILS_HREF.search(a.attributes.get('href') or '')]
+
+
+_PARSERS = {
+    'bs4': (_bs4_details, _bs4_links),
+    'lxml': (_lxml_details, _lxml_links),
+    'selectolax': (_selectolax_details, _selectolax_links),
+}
+
+
+def parse_details(html, backend='bs4'):
+    """Данные судна со страницы деталей или None"""
+    if backend not in available_backends():
+        raise ValueError(f"Разборщик {backend} недоступен, есть: {', '.join(available_backends())}")
+    return _PARSERS[backend][0](html)
+
+
+def find_detail_links(html, backend='bs4'):
+    """href ссылок на страницы деталей со страницы поиска"""
+    if backend not in available_backends():
+        raise ValueError(f"Разборщик {backend} недоступен, есть: {', '.join(available_backends())}")
+    return _PARSERS[backend][1](html)
+
+
+class PageParser:
+    """Разбор страниц вне цикла событий.
+
+    С workers > 0 разбор идёт в пуле процессов и не держит цикл,
+    пока другие запросы ждут сеть; с workers=0 - прямо в цикле
+    (для отладки и маленьких списков).
+    """
+
+    def __init__(self, backend=None, workers=None):
+        self.backend = backend or default_backend()
+        if self.backend not in available_backends():
+            raise ValueError(f"Разборщик {self.backend} недоступен")
+        self.pool = None
+        if workers != 0:
+            # spawn: дочерние процессы не наследуют состояние цикла событий и потоков aiohttp
+            self.pool = concurrent.futures.ProcessPoolExecutor(workers, mp_context=mp.get_context('spawn'))
+
+    async def _run(self, func, html):
+        if self.pool is None:
+            return func(html, self.backend)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, func, html, self.backend)
+
+    async def details(self, html):
+        return await self._run(parse_details, html)
+
+    async def links(self, html):
+        return await self._run(find_detail_links, html)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+# Разбор прямо в цикле событий тем же BeautifulSoup, что и раньше -
+# для вызовов extract_* без явного разборщика
+INLINE_PARSER = PageParser('bs4', workers=0)
@@ -0,0 +1,197 @@
+import os
+import re
+import csv
+import time
+import asyncio
+import hashlib
+from itertools import islice
+from urllib.parse import urlsplit, urlunsplit
+
+import pandas as pd
+
+RESULT_COLUMNS = ['Name', 'IMO', 'MMSI', 'Type']
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+DETAILS_ID = re.compile(r'/vessels/details/(\d+)')
+
+
+def normalize_url(url):
+    """Каноничная форма ссылки для поиска дублей: схема и хост в нижнем регистре,
+    без порта по умолчанию и #фрагмента, параметры запроса отсортированы
+    (без перекодирования значений). Только ключ: без данных для входа и с другим
+    порядком параметров это может быть уже другой ресурс, поэтому запрашивается
+    всегда исходная ссылка"""
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    netloc = (parts.hostname or '').lower()
+    if port and DEFAULT_PORTS.get(scheme) != port:
+        netloc += f':{port}'
+    query = '&'.join(sorted(p for p in parts.query.split('&') if p))
+    return urlunsplit((scheme, netloc, parts.path or '/', query, ''))
+
+
+def vessel_key(url):
+    """(хост, id судна) для ссылки на страницу деталей, иначе None"""
+    m = DETAILS_ID.search(url)
+    return (urlsplit(normalize_url(url)).netloc, m.group(1)) if m else None
+
+
+class Coalescer:
+    """Склеивает одновременные запросы одного ключа: первый вызов запускает
+    работу, остальные ждут её же результат (или исключение)"""
+
+    def __init__(self):
+        self.inflight = {}
+        self.hits = 0
+
+    async def run(self, key, factory):
+        task = self.inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self.inflight[key] = task
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        else:
+            self.hits += 1
+        # shield: отмена одного ожидающего не отменяет загрузку для остальных
+        return await asyncio.shield(task)
+
+
+def find_link_column(header):
+    """Индекс колонки со ссылками: первая, где в заголовке есть link или url, иначе нулевая"""
+    for i, col in enumerate(header):
+        if 'link' in str(col).lower() or 'url' in str(col).lower():
+            return i
+    return 0
+
+
+def iter_links(path):
+    """Ссылки из .xlsx (openpyxl в режиме только чтения) или .csv по одной строке,
+    без загрузки всего файла в память. Первая строка - заголовок"""
+    if path.lower().endswith('.csv'):
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            rows = csv.reader(f)
+            column = find_link_column(next(rows, []))
+            for row in rows:
+                if column < len(row) and row[column].strip():
+                    yield row[column].strip()
+        return
+
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        column = find_link_column(next(rows, ()))
+        for row in rows:
+            if column < len(row) and row[column] is not None:
+                yield str(row[column]).strip()
+    finally:
+        wb.close()
+
+
+def read_chunk(links, size):
+    """Следующие size ссылок (для чтения файла в отдельном потоке)"""
+    return list(islice(links, size))
+
+
+def url_key(url):
+    return hashlib.blake2b(url.encode('utf-8'), digest_size=16).digest()
+
+
+class Checkpoint:
+    """Журнал обработанных ссылок: одна ссылка на строку, дописывается по ходу.
+
+    В памяти держатся только 16-байтовые хэши, так что журнал на миллионы
+    ссылок не раздувает процесс. Ссылки с сетевыми ошибками в журнал не
+    попадают и при перезапуске обрабатываются снова.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.done = {url_key(line.rstrip('\n')) for line in f if line.strip()}
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def __contains__(self, url):
+        return url_key(url) in self.done
+
+    def __len__(self):
+        return len(self.done)
+
+    def add(self, url):
+        self.done.add(url_key(url))
+        self._file.write(url + '\n')
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ResultWriter:
+    """Результаты дописываются в CSV по мере готовности и сбрасываются на диск
+    каждые flush_every строк или flush_interval секунд вместе с журналом -
+    после сбоя теряется не больше последней порции."""
+
+    def __init__(self, path, checkpoint, flush_every=100, flush_interval=5.0):
+        self.path = path
+        self.checkpoint = checkpoint
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, 'a', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=['Link'] + RESULT_COLUMNS)
+        if new:
+            self._writer.writeheader()
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+    def add(self, url, ship):
+        """Отмечает ссылку обработанной; ship (или None) - найденное судно"""
+        if ship:
+            self._writer.writerow({'Link': url, **ship})
+        self.checkpoint.add(url)
+        self.pending += 1
+        if (self.pending >= self.flush_every
+                or time.monotonic() - self.last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        # Сначала результаты, потом журнал: при сбое между ними ссылка просто
+        # обработается повторно, а дубль уберёт export
+        self._file.flush()
+        self.checkpoint.flush()
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+
+def export_results(partial_path, output_file, input_file):
+    """Итоговый файл из накопленного CSV: строка на каждую исходную ссылку
+    с найденным судном, в порядке входного файла - дубли ссылок загружались
+    один раз, но в результат попадают все. Возвращает число строк"""
+    found = pd.read_csv(partial_path, dtype=str, keep_default_na=False)
+    ships = {row['Link']: row for row in found.to_dict('records')}
+    rows = []
+    for url in iter_links(input_file):
+        ship = ships.get(normalize_url(url))
+        if ship is not None:
+            rows.append({c: ship[c] for c in RESULT_COLUMNS})
+    if not rows:
+        return 0
+    df = pd.DataFrame(rows, columns=RESULT_COLUMNS)
+    if output_file.lower().endswith('.csv'):
+        df.to_csv(output_file, index=False)
+    else:
+        df.to_excel(output_file, index=False)
+    return len(df)
@@ -1,100 +1,110 @@
+import os
 import aiohttp
 import asyncio
-from bs4 import BeautifulSoup
-import pandas as pd
 from urllib.parse import urljoin
-import re
 
+from http_cache import HttpCache, DEFAULT_CACHE_DIR, DEFAULT_TTL
+from metrics import metrics, format_summary
+from parsers import PageParser, INLINE_PARSER
+from pipeline import (Checkpoint, Coalescer, ResultWriter, export_results, iter_links,
+                      normalize_url, read_chunk, url_key, vessel_key)
+from throttle import AdaptiveLimiter, RetryPolicy, THROTTLE_STATUSES, RETRY_STATUSES, parse_retry_after
 
-async def extract_ship_from_details_page(session, url, headers):
-    """Извлекает информацию о судне со страницы деталей"""
-    try:
-        async with session.get(url, headers=headers) as response:
-            if response.status != 200:
-                return None
-            html = await response.text()
-            soup = BeautifulSoup(html, 'html.parser')
-        
-        ship_data = {}
-        
-        # Извлекаем название из h1
-        h1 = soup.find('h1')
-        if h1:
-            ship_data['Name'] = h1.get_text(strip=True)
-        
-        # Извлекаем IMO и тип из h2
-        h2 = soup.find('h2')
-        if h2:
-            h2_text = h2.get_text()
-            imo_match = re.search(r'IMO\s*(\d+)', h2_text, re.IGNORECASE)
-            if imo_match:
-                ship_data['IMO'] = imo_match.group(1)
-            
-            parts = h2_text.split(',')
-            if parts:
-                type_candidate = parts[0].strip()
-                if type_candidate and 'IMO' not in type_candidate.upper():
-                    ship_data['Type'] = type_candidate
-        
-        # Ищем MMSI, IMO и тип в таблицах
-        for table in soup.find_all('table'):
-            for row in table.find_all('tr'):
-                cells = row.find_all(['td', 'th'])
-                if len(cells) >= 2:
-                    label = cells[0].get_text(strip=True).lower()
-                    value = cells[1].get_text(strip=True)
-                    
-                    if 'mmsi' in label and 'MMSI' not in ship_data:
-                        mmsi_match = re.search(r'\d+', value)
-                        if mmsi_match:
-                            ship_data['MMSI'] = mmsi_match.group(0)
-                    
-                    if 'imo' in label and 'IMO' not in ship_data:
-                        imo_match = re.search(r'\d+', value)
-                        if imo_match:
-                            ship_data['IMO'] = imo_match.group(0)
-                    
-                    if ('type' in label or 'тип' in label) and 'Type' not in ship_data:
-                        ship_data['Type'] = value
-        
-        # Ищем MMSI в тексте страницы
-        if 'MMSI' not in ship_data:
-            page_text = soup.get_text()
-            mmsi_match = re.search(r'MMSI[:\s]*(\d+)', page_text, re.IGNORECASE)
-            if mmsi_match:
-                ship_data['MMSI'] = mmsi_match.group(1)
-        
-        if ship_data.get('Name') or ship_data.get('IMO'):
-            return {
-                'Name': ship_data.get('Name', 'N/A'),
-                'IMO': ship_data.get('IMO', 'N/A'),
-                'MMSI': ship_data.get('MMSI', 'N/A'),
-                'Type': ship_data.get('Type', 'N/A')
-            }
-        return None
-        
-    except Exception as e:
-        print(f"Ошибка при извлечении данных {url}: {e}")
-        return None
+
+async def fetch_html(session, url, headers, cache=None, limiter=None, retry=None):
+    """Загружает страницу, возвращает (статус, html); html равен None, если статус не 200.
+    С кэшем свежие страницы берутся с диска, устаревшие перепроверяются.
+    limiter (throttle.AdaptiveLimiter) задаёт темп запросов к хосту, retry
+    (throttle.RetryPolicy) - повторы при 429/5xx и сетевых ошибках"""
+    entry = cache.get(url) if cache else None
+    if entry and cache.is_fresh(entry):
+        metrics.inc('cache_fresh')
+        return 200, entry['body']
+    request_headers = {**headers, **HttpCache.validators(entry)} if entry else headers
+    host = limiter.for_url(url) if limiter else None
+    retries = retry.retries if retry else 0
+    
+    for attempt in range(retries + 1):
+        if host:
+            with metrics.timer('throttle_wait'):
+                await host.acquire()
+        retry_after = None
+        started = metrics.request_started()
+        try:
+            async with session.get(url, headers=request_headers) as response:
+                status = response.status
+                metrics.status(status)
+                if status in THROTTLE_STATUSES:
+                    metrics.inc('throttled')
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    if host:
+                        host.on_throttle(retry_after)
+                elif status not in RETRY_STATUSES:
+                    if host:
+                        host.on_success()
+                    if status == 304 and entry:
+                        metrics.inc('cache_revalidated')
+                        cache.refresh(url, entry)
+                        return 200, entry['body']
+                    if status != 200:
+                        return status, None
+                    with metrics.timer('download'):
+                        html = await response.text()
+                    if cache:
+                        cache.put(url, html, response.headers)
+                    return 200, html
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            metrics.error(e)
+            if attempt == retries:
+                raise
+        finally:
+            metrics.request_finished(started)
+        if attempt == retries:
+            return status, None
+        metrics.inc('retries')
+        await asyncio.sleep(retry.delay(attempt, retry_after))
 
 
-async def extract_ship_info(session, url, headers):
+async def fetch_details(session, url, headers, cache=None, parser=None, limiter=None, retry=None,
+                        coalescer=None):
+    """Загружает и разбирает страницу деталей, возвращает (статус, судно или None).
+    С coalescer одновременные запросы одного судна (по хосту и id) сводятся
+    к одной загрузке - остальные ждут её результат"""
+    async def load():
+        status, html = await fetch_html(session, url, headers, cache, limiter, retry)
+        if html is None:
+            return status, None
+        with metrics.timer('parse'):
+            return status, await (parser or INLINE_PARSER).details(html)
+
+    key = vessel_key(url) if coalescer else None
+    if key is None:
+        return await load()
+    return await coalescer.run(key, load)
+
+
+async def extract_ship_info(session, url, headers, cache=None, parser=None, limiter=None, retry=None,
+                            coalescer=None):
     """Извлекает информацию о судах со страницы"""
+    parser = parser or INLINE_PARSER
     try:
-        async with session.get(url, headers=headers) as response:
-            if response.status != 200:
-                print(f"HTTP {response.status} для {url}")
-                return None
-            html = await response.text()
-            soup = BeautifulSoup(html, 'html.parser')
-        
-        # Если это страница деталей
+        # Страница деталей - сразу разбираем её, склеивая с такими же запросами
         if '/vessels/details/' in url:
-            ship = await extract_ship_from_details_page(session, url, headers)
+            status, ship = await fetch_details(session, url, headers, cache, parser, limiter,
+                                               retry, coalescer)
+            if status != 200:
+                print(f"HTTP {status} для {url}")
+                return None
             return [ship] if ship else []
         
+        status, html = await fetch_html(session, url, headers, cache, limiter, retry)
+        if html is None:
+            print(f"HTTP {status} для {url}")
+            return None
+        
         # Страница поиска - считаем количество судов
-        detail_links = soup.find_all('a', href=re.compile(r'/vessels/details/\d+'))
+        with metrics.timer('parse'):
+            detail_links = await parser.links(html)
         ship_count = len(detail_links)
         
         if ship_count == 0:
@@ -106,107 +116,218 @@ async def extract_ship_info(session, url, headers):
         
         # Ровно одно судно - получаем данные
         if ship_count == 1 and detail_links:
-            details_url = urljoin(url, detail_links[0]['href'])
-            ship = await extract_ship_from_details_page(session, details_url, headers)
+            details_url = urljoin(url, detail_links[0])
+            status, ship = await fetch_details(session, details_url, headers, cache, parser,
+                                               limiter, retry, coalescer)
+            if status != 200:
+                # Не "судов не найдено", а сбой - ссылку повторим при перезапуске
+                print(f"HTTP {status} для {details_url}")
+                return None
             return [ship] if ship else []
         
         return []
         
     except aiohttp.ClientError as e:
         print(f"Ошибка сети для {url}: {type(e).__name__}: {e}")
+        metrics.error(e, link=True)
         return None
     except Exception as e:
         print(f"Ошибка при обработке {url}: {type(e).__name__}: {e}")
+        metrics.error(e, link=True)
         return None
 
 
-async def process_single_link(session, semaphore, url, headers):
-    """Обрабатывает одну ссылку с ограничением параллелизма"""
-    if not url or not url.startswith('http'):
+def pick_ship(url, ships):
+    """Судно из результата extract_ship_info, если оно ровно одно"""
+    if len(ships) == 0:
+        print(f"Судов не найдено: {url}")
         return None
     
-    async with semaphore:
-        try:
-            ships = await extract_ship_info(session, url, headers)
-            
-            if ships is None:
-                return None
-            
-            if len(ships) == 0:
-                print(f"Судов не найдено: {url}")
-                return None
-            
-            if len(ships) > 1:
-                print(f"Найдено {len(ships)} судов: {url}")
-                return None
-            
-            return ships[0]
-        except Exception as e:
-            print(f"Ошибка в process_single_link для {url}: {type(e).__name__}: {e}")
-            return None
+    if len(ships) > 1:
+        print(f"Найдено {len(ships)} судов: {url}")
+        return None
+    
+    return ships[0]
+
 
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+}
 
-async def process_links_async(input_file='Links.xlsx', output_file='result.xlsx'):
-    """Асинхронно обрабатывает ссылки из файла"""
+
+async def read_links(input_file, queue, checkpoint, workers, chunk_size=500):
+    """Производитель: читает ссылки порциями в отдельном потоке и кладёт в очередь
+    как есть, пропуская уже обработанные и повторы - их ищем по нормализованной
+    форме (в результат повторы попадут при экспорте). В конце - по None на
+    каждого рабочего.
+    Возвращает (пропущено готовых, пропущено повторов)"""
+    links = iter_links(input_file)
+    skipped = duplicates = 0
+    seen = set()
     try:
-        df_links = pd.read_excel(input_file)
-        
-        link_column = None
-        for col in df_links.columns:
-            if 'link' in str(col).lower() or 'url' in str(col).lower():
-                link_column = col
+        while True:
+            chunk = await asyncio.to_thread(read_chunk, links, chunk_size)
+            if not chunk:
                 break
-        
-        if link_column is None:
-            link_column = df_links.columns[0]
-        
+            for url in chunk:
+                normalized = normalize_url(url)
+                if not normalized.startswith('http'):
+                    continue
+                key = url_key(normalized)
+                if key in seen:
+                    duplicates += 1
+                    continue
+                seen.add(key)
+                if normalized in checkpoint:
+                    skipped += 1
+                    continue
+                await queue.put(url.strip())
+    finally:
+        for _ in range(workers):
+            await queue.put(None)
+    return skipped, duplicates
+
+
+async def link_worker(queue, writer, stats, session, headers, cache, parser, limiter, retry,
+                      coalescer=None):
+    """Рабочий: берёт ссылки из очереди, пока не встретит None"""
+    while True:
+        url = await queue.get()
+        if url is None:
+            return
+        with metrics.link(url) as link:
+            try:
+                ships = await extract_ship_info(session, url, headers, cache, parser, limiter, retry,
+                                                coalescer)
+            except Exception as e:
+                print(f"Ошибка при обработке {url}: {type(e).__name__}: {e}")
+                metrics.error(e, link=True)
+                ships = None
+            if ships is None:
+                # Ошибка сети или HTTP - не отмечаем, при перезапуске попробуем снова
+                stats['failed'] += 1
+                continue
+            ship = pick_ship(url, ships)
+            link['outcome'] = 'found' if ship else 'multiple' if len(ships) > 1 else 'not_found'
+        # Журнал и результаты - по нормализованной ссылке, по ней же их сводит export
+        writer.add(normalize_url(url), ship)
+        stats['done'] += 1
+        stats['found'] += bool(ship)
+
+
+async def process_links_async(input_file='Links.xlsx', output_file='result.xlsx',
+                              cache_dir=DEFAULT_CACHE_DIR, cache_ttl=DEFAULT_TTL,
+                              parser_backend=None, parse_workers=None,
+                              max_concurrency=20, start_rate=5.0, max_rate=50.0,
+                              retries=3, timeout=90, resume=True, report=True):
+    """Асинхронно обрабатывает ссылки из файла.
+    Ответы кэшируются в cache_dir (None - без кэша) на cache_ttl секунд.
+    Страницы разбираются parser_backend (bs4, lxml, selectolax; по умолчанию
+    самый быстрый из установленных) в parse_workers процессах (0 - в цикле событий).
+    Темп запросов к каждому хосту подбирается сам от start_rate до max_rate
+    запросов/с, ссылки обрабатывают max_concurrency рабочих, неудачный запрос
+    повторяется до retries раз.
+    
+    Одинаковые после нормализации ссылки загружаются один раз, одновременные
+    запросы одного судна с разных ссылок - тоже.
+    Ссылки читаются потоком, результаты по ходу дописываются в
+    <output>.partial.csv, обработанные ссылки - в <output>.done. Прерванный
+    запуск с resume=True продолжается с места остановки. Результат пишется
+    в output_file, а если ошибок не было - служебные файлы удаляются.
+    
+    С report=True рядом с output_file пишутся <output>.report.json (скорость,
+    p50/p95 этапов запроса, статусы, ошибки, повторы, очередь и запросы в полёте
+    по секундам) и <output>.links.csv с исходом и временами каждой ссылки
+    этого запуска"""
+    base = os.path.splitext(output_file)[0]
+    partial_path, checkpoint_path = base + '.partial.csv', base + '.done'
+    report_path, link_log_path = base + '.report.json', base + '.links.csv'
+    if not resume:
+        for path in (partial_path, checkpoint_path):
+            if os.path.exists(path):
+                os.remove(path)
+    
+    try:
+        # Заголовок читаем сразу, чтобы ошибка в файле была видна до запуска рабочих
+        next(iter_links(input_file), None)
     except Exception as e:
         print(f"Ошибка при чтении файла {input_file}: {e}")
         return
     
-    urls = [str(row[link_column]).strip() for _, row in df_links.iterrows()]
-    
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-        'Sec-Fetch-Dest': 'document',
-        'Sec-Fetch-Mode': 'navigate',
-        'Sec-Fetch-Site': 'none',
-    }
+    # Параллелизм ограничен числом рабочих, а темп по хосту подстраивается под ответы:
+    # на 429/503 и Retry-After запросы замедляются, на успешных - ускоряются
+    connector = aiohttp.TCPConnector(limit=max_concurrency, ttl_dns_cache=300)
+    timeout = aiohttp.ClientTimeout(total=timeout, connect=30)
+    limiter = AdaptiveLimiter(rate=start_rate, max_rate=max_rate)
+    retry = RetryPolicy(retries)
+    coalescer = Coalescer()
     
-    # Ограничиваем параллелизм для избежания блокировки
-    semaphore = asyncio.Semaphore(5)  # Уменьшено для избежания блокировки
-    connector = aiohttp.TCPConnector(limit=20, limit_per_host=3, ttl_dns_cache=300)
-    timeout = aiohttp.ClientTimeout(total=90, connect=30)
+    cache = HttpCache(cache_dir, cache_ttl) if cache_dir else None
+    parser = PageParser(parser_backend, parse_workers)
+    checkpoint = Checkpoint(checkpoint_path)
+    writer = ResultWriter(partial_path, checkpoint)
+    queue = asyncio.Queue(maxsize=2 * max_concurrency)
+    stats = {'done': 0, 'found': 0, 'failed': 0}
     
-    results = []
+    metrics.reset()
+    metrics.enabled = report
+    trace_configs = None
+    if report:
+        metrics.open_link_log(link_log_path)
+        trace_configs = [metrics.trace_config()]
+    sampler = asyncio.create_task(metrics.sample(queue)) if report else None
     
-    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
-        tasks = [process_single_link(session, semaphore, url, headers) for url in urls]
-        
-        for coro in asyncio.as_completed(tasks):
+    try:
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         trace_configs=trace_configs) as session:
+            workers = [asyncio.create_task(link_worker(queue, writer, stats, session, HEADERS,
+                                                       cache, parser, limiter, retry, coalescer))
+                       for _ in range(max_concurrency)]
             try:
-                result = await coro
-                if result:
-                    results.append(result)
-            except Exception as e:
-                print(f"Ошибка при выполнении задачи: {type(e).__name__}: {e}")
+                skipped, duplicates = await read_links(input_file, queue, checkpoint,
+                                                       max_concurrency)
+            finally:
+                await asyncio.gather(*workers)
+    finally:
+        if sampler:
+            sampler.cancel()
+            metrics.sample_once(queue)
+        metrics.close_link_log()
+        writer.close()
+        checkpoint.close()
+        parser.close()
     
-    if results:
-        try:
-            df_results = pd.DataFrame(results)
-            df_results.to_excel(output_file, index=False)
-        except Exception as e:
-            print(f"Ошибка при записи в {output_file}: {e}")
+    if report:
+        summary = metrics.write_report(
+            report_path, skipped=skipped, duplicates=duplicates, coalesced=coalescer.hits,
+            host_rates={host: round(h.rate, 2) for host, h in limiter.hosts.items()})
+        metrics.enabled = False
+        print(format_summary(summary))
+    
+    print(f"Обработано {stats['done']} ссылок (пропущено уже готовых: {skipped}, "
+          f"повторов: {duplicates}, общих загрузок судна: {coalescer.hits}), "
+          f"найдено судов: {stats['found']}, с ошибками: {stats['failed']}")
+    try:
+        export_results(partial_path, output_file, input_file)
+    except Exception as e:
+        print(f"Ошибка при записи в {output_file}: {e}")
+        return
+    if not stats['failed']:
+        os.remove(partial_path)
+        os.remove(checkpoint_path)
 
 
-def process_links(input_file='Links.xlsx', output_file='result.xlsx'):
-    """Синхронная обертка"""
-    asyncio.run(process_links_async(input_file, output_file))
+def process_links(input_file='Links.xlsx', output_file='result.xlsx', **options):
+    """Синхронная обертка, options - как у process_links_async"""
+    asyncio.run(process_links_async(input_file, output_file, **options))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,113 @@
+import time
+import random
+import asyncio
+import argparse
+
+import pandas as pd
+from aiohttp import web
+
+DETAILS_PAGE = """<html><body><h1>VESSEL {vid}</h1><h2>Bulk Carrier, IMO {imo}</h2>
+<table><tr><td>MMSI</td><td>{mmsi}</td></tr><tr><td>Flag</td><td>Panama</td></tr></table>
+</body></html>"""
+
+
+class Throttle:
+    """Окно в одну секунду: сверх rate запросов/с отвечаем 429 с Retry-After"""
+
+    def __init__(self, rate, retry_after=1):
+        self.rate = rate
+        self.retry_after = retry_after
+        self.window = 0
+        self.count = 0
+
+    def allow(self):
+        if not self.rate:
+            return True
+        now = int(time.monotonic())
+        if now != self.window:
+            self.window, self.count = now, 0
+        self.count += 1
+        return self.count <= self.rate
+
+
+def make_app(rate=0, error_rate=0.0, latency=0.0, retry_after=1, seed=0):
+    """Заглушка сайта с судами: /vessels/details/<id> и /search?ids=1,2.
+
+    rate - сколько запросов/с пропускать (0 - без ограничения), error_rate -
+    доля случайных 503, latency - задержка ответа в секундах. Счётчики
+    ответов по статусам отдаются на /stats.
+    """
+    rng = random.Random(seed)
+    throttle = Throttle(rate, retry_after)
+    stats = {}
+
+    def count(status):
+        stats[status] = stats.get(status, 0) + 1
+
+    @web.middleware
+    async def limits(request, handler):
+        if request.path == '/stats':
+            return await handler(request)
+        if latency:
+            await asyncio.sleep(latency)
+        if not throttle.allow():
+            count(429)
+            return web.Response(status=429, headers={'Retry-After': str(retry_after)})
+        if error_rate and rng.random() < error_rate:
+            count(503)
+            return web.Response(status=503)
+        response = await handler(request)
+        count(response.status)
+        return response
+
+    async def details(request):
+        vid = int(request.match_info['vid'])
+        return web.Response(text=DETAILS_PAGE.format(vid=vid, imo=9_000_000 + vid % 1_000_000,
+                                                     mmsi=200_000_000 + vid),
+                            content_type='text/html')
+
+    async def search(request):
+        ids = [i for i in request.query.get('ids', '').split(',') if i]
+        links = ''.join(f'<a href="/vessels/details/{i}">{i}</a>' for i in ids)
+        return web.Response(text=f'<html><body>{links}</body></html>', content_type='text/html')
+
+    async def show_stats(request):
+        return web.json_response(stats)
+
+    app = web.Application(middlewares=[limits])
+    app.router.add_get(r'/vessels/details/{vid:\d+}', details)
+    app.router.add_get('/search', search)
+    app.router.add_get('/stats', show_stats)
+    app['stats'] = stats
+    return app
+
+
+def write_links(path, base_url, count, duplicates=0.0, seed=0):
+    """Links.xlsx для заглушки: ссылки на детали и на поиск с одним судном"""
+    rng = random.Random(seed)
+    urls = []
+    for i in range(count):
+        if urls and rng.random() < duplicates:
+            urls.append(rng.choice(urls))
+        elif i % 2:
+            urls.append(f'{base_url}/search?ids={i}')
+        else:
+            urls.append(f'{base_url}/vessels/details/{i}')
+    pd.DataFrame({'Link': urls}).to_excel(path, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная заглушка сайта с судами")
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--rate', type=int, default=20, help="запросов/с до ответа 429 (0 - без лимита)")
+    parser.add_argument('--errors', type=float, default=0.0, help="доля случайных 503")
+    parser.add_argument('--latency', type=float, default=0.0, help="задержка ответа, с")
+    parser.add_argument('--links', type=int, default=0, help="записать Links.xlsx на столько ссылок")
+    args = parser.parse_args()
+    if args.links:
+        write_links('Links.xlsx', f'http://127.0.0.1:{args.port}', args.links)
+    web.run_app(make_app(args.rate, args.errors, args.latency), host='127.0.0.1', port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import time
+import random
+import asyncio
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+# 429 и 503 - сервер просит притормозить, остальные - временные сбои
+THROTTLE_STATUSES = {429, 503}
+RETRY_STATUSES = THROTTLE_STATUSES | {500, 502, 504}
+MAX_RETRY_AFTER = 300
+
+
+def parse_retry_after(value):
+    """Retry-After в секундах: число или HTTP-дата; None, если не разобрать"""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+
+class RetryPolicy:
+    """Повторы с экспоненциальной задержкой и случайным разбросом (full jitter)"""
+
+    def __init__(self, retries=3, base=0.5, cap=30.0):
+        self.retries = retries
+        self.base = base
+        self.cap = cap
+
+    def delay(self, attempt, retry_after=None):
+        backoff = random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+        # Retry-After от сервера - нижняя граница, раньше повторять бессмысленно
+        return max(backoff, retry_after or 0.0)
+
+
+class HostLimiter:
+    """Корзина токенов одного хоста со скоростью по AIMD.
+
+    До первого отказа скорость растёт на 1 за каждый успешный ответ, то есть
+    удваивается за секунду (медленный старт, как в TCP). Потом каждый успех
+    прибавляет increase/rate - примерно increase запросов/с за секунду работы.
+    429/503 делят скорость на 1/decrease (не чаще раза в cooldown секунд, чтобы
+    пачка одновременных отказов не обвалила её до минимума), а Retry-After
+    ставит хост на паузу.
+    """
+
+    def __init__(self, rate=5.0, min_rate=0.5, max_rate=50.0, increase=1.0, decrease=0.5,
+                 cooldown=1.0):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.slow_start = True
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        # Запас не больше секунды работы: после простоя не будет залпа запросов
+        self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self.tokens) / self.rate)
+
+    def on_success(self):
+        step = 1.0 if self.slow_start else self.increase / self.rate
+        self.rate = min(self.max_rate, self.rate + step)
+
+    def on_throttle(self, retry_after=None):
+        now = time.monotonic()
+        self.slow_start = False
+        if now - self.last_decrease >= self.cooldown:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.tokens = min(self.tokens, 0.0)
+            self.last_decrease = now
+        if retry_after:
+            self.paused_until = max(self.paused_until, now + retry_after)
+
+
+class AdaptiveLimiter:
+    """HostLimiter на каждый хост, создаётся при первом обращении"""
+
+    def __init__(self, **host_options):
+        self.host_options = host_options
+        self.hosts = {}
+
+    def for_url(self, url):
+        host = urlsplit(url).netloc.lower()
+        limiter = self.hosts.get(host)
+        if limiter is None:
+            limiter = self.hosts[host] = HostLimiter(**self.host_options)
+        return limiter